@@ -1,5 +1,7 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple, OrderedDict
+import itertools
 import operator
+import weakref
 from functools import reduce
 # NB .relationships.minhash is imported at the END of this module to solve a
 # circular dependancy issue, using the statement below.
@@ -8,6 +10,94 @@ from functools import reduce
 # from .relationships import jaccard as jc
 
 
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _SignatureCache(object):
+    # A least recently used cache of Family signatures, shared by all
+    # families, so that its size is bounded however many families and Hashes
+    # objects are created.
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key):
+        # Get an entry without counting it as a use.
+        return self._entries.get(key)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._entries))
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries.clear()
+
+
+_signature_cache = _SignatureCache(maxsize=4096)
+_family_ids = itertools.count()
+
+
+def signature_cache_info():
+    """
+    Get statistics for the cache of Family signatures and full hashes.
+
+    Returns
+    -------
+    CacheInfo
+        The number of cache hits and misses, the maximum number of entries,
+        and the current number of entries.
+    """
+    return _signature_cache.info()
+
+
+def set_signature_cache_size(maxsize):
+    """
+    Set the maximum number of entries in the cache of Family signatures.
+
+    Parameters
+    ----------
+    maxsize : int
+    """
+    _signature_cache.resize(maxsize)
+
+
+def clear_signature_cache():
+    """
+    Empty the cache of Family signatures, and reset its statistics.
+    """
+    _signature_cache.clear()
+
+
 class Family(object):
     """
     A protein family.
@@ -15,22 +105,44 @@ class Family(object):
     This class allows a protein family, defined by contiguous regions on
     one or more proteins, to be compared to other protein families, and to
     Pfam, via MinHash.
+
+    Signatures and full hashes are cached in a single, bounded, cache shared
+    by all families. Entries are keyed by the family, and by the `key` of
+    the Hashes object, so Hashes objects with the same configuration share
+    entries.
     """
     def __init__(self, _regions=None):
         if _regions == None:
             self._regions = defaultdict(list)
         else:
             self._regions = _regions
-        self._signatures = {}
-        self._fhashes = {}
+        self._id = next(_family_ids)
+        self._hashes_by_key = {}
         self._finalised = False
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_hashes_by_key"]
+        del state["_id"]
+        return state
+
+    def __setstate__(self, state):
+        # Cache entries are not carried over, as the cache in another process
+        # may hold entries for the same ID made before any later regions were
+        # added.
+        self.__dict__.update(state)
+        self._id = next(_family_ids)
+        self._hashes_by_key = {}
+
     def add_region(self, acc, start, end):
         """
         Add a protein sequence region to the protein family.
 
         This method should only be called before the Family has been finalised.
 
+        Any signatures and full hashes which have already been computed for
+        the Family are updated with the new region, rather than recomputed.
+
         Parameters
         ----------
         acc : str
@@ -46,7 +158,22 @@ class Family(object):
         """
         if not self._finalised:
             self._regions[acc].append((start, end))
-            self._signatures = {}
+            for key, hashes_ref in list(self._hashes_by_key.items()):
+                hashes = hashes_ref()
+                if hashes is None:
+                    # Without the Hashes object, cached values can't be
+                    # updated, so they are dropped, to be recomputed.
+                    _signature_cache.pop((self._id, key, "signature"))
+                    _signature_cache.pop((self._id, key, "full_hash"))
+                    del self._hashes_by_key[key]
+                    continue
+                elements = list(hashes.elements([(acc, start, end)]))
+                sketch = _signature_cache.peek((self._id, key, "signature"))
+                if sketch is not None:
+                    sketch.update(elements)
+                fhash = _signature_cache.peek((self._id, key, "full_hash"))
+                if fhash is not None:
+                    fhash |= mh.set_hashes(elements, hashes.hash_function)
         else:
             raise RuntimeError()
 
@@ -57,6 +184,7 @@ class Family(object):
         Once called, regions can no longer be added to the Family.
         """
         self._finalised = True
+        self._hashes_by_key = {}
 
     def proteins(self):
         """
@@ -128,21 +256,30 @@ class Family(object):
             The first element of the tuples is a hash, the second is the
             object from which that hash was generated.
         """
-        try:
-            sig = self._signatures[hashes]
-        except KeyError:
-            sig = hashes.signature(self)
-            self._signatures[hashes] = sig
-        return sig
+        cache_key = (self._id, hashes.key, "signature")
+        sketch = _signature_cache.get(cache_key)
+        if sketch is None:
+            sketch = hashes.sketch(self)
+            _signature_cache.put(cache_key, sketch)
+        self._remember(hashes)
+        return sketch.signature()
 
     def full_hash(self, hashes):
-        try:
-            fhash = self._fhashes[hashes]
-        except KeyError:
+        cache_key = (self._id, hashes.key, "full_hash")
+        fhash = _signature_cache.get(cache_key)
+        if fhash is None:
             fhash = hashes.full_hash(self)
-            self._fhashes[hashes] = fhash
+            _signature_cache.put(cache_key, fhash)
+        self._remember(hashes)
         return fhash
 
+    def _remember(self, hashes):
+        # Keep a weak reference to a Hashes object with which cached values
+        # were computed, so that they can be updated by `add_region` without
+        # keeping the Pfam signatures alive.
+        if not self._finalised:
+            self._hashes_by_key[hashes.key] = weakref.ref(hashes)
+
     def estimate_jaccard_with_pfam(self, hashes):
         """
         Estimate the Jaccard index between the members of this protein family
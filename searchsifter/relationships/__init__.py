@@ -1 +1 @@
-from . import hmmer, minhash, pfam, jaccard, pfam_db, pfam_file
+from . import hmmer, minhash, pfam, jaccard, pfam_db, pfam_file, synthetic
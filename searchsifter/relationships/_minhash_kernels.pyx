@@ -0,0 +1,72 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled kernels for scoring sorted signatures.
+
+These compute the same scores as `minhash.sorted_minhash` and
+`minhash.sorted_containment`, with a single linear merge of each row of
+signatures with the query, rather than sorting. They are used by `minhash`
+when this module has been built.
+"""
+import numpy as np
+from libc.stdint cimport uint64_t
+
+cdef uint64_t PAD = 0xffffffffffffffff
+
+
+cdef Py_ssize_t _length(const uint64_t[:] row) nogil:
+    cdef Py_ssize_t i = 0
+    while i < row.shape[0] and row[i] != PAD:
+        i += 1
+    return i
+
+
+def jaccard_rows(const uint64_t[:, :] signatures, const uint64_t[:] t,
+                 Py_ssize_t n):
+    """See `minhash.sorted_minhash`."""
+    cdef Py_ssize_t rows = signatures.shape[0]
+    cdef Py_ssize_t lt = _length(t)
+    cdef Py_ssize_t r, i, j, la, union, shared
+    out = np.zeros(rows)
+    cdef double[:] scores = out
+    with nogil:
+        for r in range(rows):
+            la = _length(signatures[r])
+            i = j = union = shared = 0
+            # Merge the rows until the bottom n of the union have been seen.
+            while union < n and (i < la or j < lt):
+                if j >= lt or (i < la and signatures[r, i] < t[j]):
+                    i += 1
+                elif i >= la or t[j] < signatures[r, i]:
+                    j += 1
+                else:
+                    shared += 1
+                    i += 1
+                    j += 1
+                union += 1
+            if union > 0:
+                scores[r] = <double> shared / union
+    return out
+
+
+def containment_rows(const uint64_t[:, :] signatures, const uint64_t[:] t):
+    """See `minhash.sorted_containment`."""
+    cdef Py_ssize_t rows = signatures.shape[0]
+    cdef Py_ssize_t lt = t.shape[0]
+    cdef Py_ssize_t r, i, j, la, shared
+    out = np.zeros(rows)
+    cdef double[:] scores = out
+    with nogil:
+        for r in range(rows):
+            la = _length(signatures[r])
+            i = j = shared = 0
+            while i < la and j < lt:
+                if signatures[r, i] < t[j]:
+                    i += 1
+                elif t[j] < signatures[r, i]:
+                    j += 1
+                else:
+                    shared += 1
+                    i += 1
+                    j += 1
+            if la > 0:
+                scores[r] = <double> shared / la
+    return out
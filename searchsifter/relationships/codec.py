@@ -0,0 +1,306 @@
+"""Store MinHash signatures compactly on disk.
+
+A file holds the signatures of many families, as written by
+`write_signatures`. Families are grouped into blocks, each compressed
+separately, so one family can be read without decompressing the others.
+
+Within a block, signatures are stored as columns: the length of each
+signature, then the sorted hashes of every signature, delta encoded within
+each signature, then their protein accessions, as indexes into a dictionary
+of accessions shared by the whole file, and, for residue signatures, their
+chunk numbers. Each column is a sequence of variable length integers.
+
+The file begins with `MAGIC`, a version byte, and a JSON header giving the
+signature length, the width of the hashes, the kind of element, and the
+location of the accession dictionary and of each block. Files of version 1
+don't record the width of the hashes, which are 32 bit.
+"""
+import json
+import zlib
+import numpy as np
+
+MAGIC = b"SSHC"
+VERSION = 2
+
+ELEMENT_PROTEIN = "protein"
+ELEMENT_CHUNK = "chunk"
+
+
+def encode_varints(values, out):
+    """Append non-negative integers to a bytearray as variable length integers.
+
+    Each integer is written seven bits at a time, least significant first,
+    with the high bit of each byte set if more bytes follow.
+
+    Parameters
+    ----------
+    values : iterable of int
+    out : bytearray
+    """
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7f) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def decode_varints(data, pos, count):
+    """Read variable length integers written by `encode_varints`.
+
+    Parameters
+    ----------
+    data : bytes
+    pos : int
+        The position of the first integer in `data`.
+    count : int
+        The number of integers to read.
+
+    Returns
+    -------
+    values : list of int
+    pos : int
+        The position after the last integer.
+    """
+    values = []
+    for _ in range(count):
+        v = 0
+        shift = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            v |= (b & 0x7f) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        values.append(v)
+    return values, pos
+
+
+def write_signatures(signatures, save_file, n, block_size=256, level=9,
+                     hash_bits=32):
+    """Write signatures to a binary file.
+
+    Parameters
+    ----------
+    signatures : dict
+        Signatures, as returned by `minhash.signature`, keyed by family
+        accession. The hashed objects must all be protein accessions, or
+        all be (protein accession, chunk) tuples.
+    save_file : file_like
+        A file opened for writing bytes.
+    n : int
+        The signature length.
+    block_size : int
+        The number of families in each block.
+    level : int
+        The zlib compression level.
+    hash_bits : int
+        The width of the hashes.
+    """
+    families = list(signatures)
+    sorted_signatures = [sorted(signatures[f]) for f in families]
+    element = ELEMENT_PROTEIN
+    for sig in sorted_signatures:
+        if sig:
+            if isinstance(sig[0][1], tuple):
+                element = ELEMENT_CHUNK
+            break
+
+    def accession(e):
+        return e[0] if element == ELEMENT_CHUNK else e
+
+    accessions = sorted({accession(e) for sig in sorted_signatures
+                         for _, e in sig})
+    accession_ids = {acc: i for i, acc in enumerate(accessions)}
+
+    data = bytearray(zlib.compress("\n".join(accessions).encode(), level))
+    header = {"n": n, "hash_bits": hash_bits, "element": element,
+              "accessions": [0, len(data), len(accessions)], "blocks": []}
+    for start in range(0, len(families), block_size):
+        sigs = sorted_signatures[start:start + block_size]
+        block = bytearray()
+        encode_varints((len(sig) for sig in sigs), block)
+        for sig in sigs:
+            previous = 0
+            for h, _ in sig:
+                encode_varints([h - previous], block)
+                previous = h
+        encode_varints((accession_ids[accession(e)]
+                        for sig in sigs for _, e in sig), block)
+        if element == ELEMENT_CHUNK:
+            encode_varints((e[1] for sig in sigs for _, e in sig), block)
+        compressed = zlib.compress(bytes(block), level)
+        header["blocks"].append([len(data), len(compressed),
+                                 families[start:start + block_size]])
+        data += compressed
+
+    header_bytes = json.dumps(header).encode()
+    prefix = bytearray(MAGIC)
+    prefix.append(VERSION)
+    encode_varints([len(header_bytes)], prefix)
+    save_file.write(bytes(prefix) + header_bytes + bytes(data))
+
+
+def decode_varint_array(data, pos, count):
+    """Read variable length integers written by `encode_varints` into an array.
+
+    This is equivalent to `decode_varints`, but vectorised. The integers
+    must be less than 2 ** 64.
+
+    Parameters
+    ----------
+    data : bytes
+    pos : int
+        The position of the first integer in `data`.
+    count : int
+        The number of integers to read.
+
+    Returns
+    -------
+    values : numpy.ndarray of uint64
+    pos : int
+        The position after the last integer.
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64), pos
+    b = np.frombuffer(data, dtype=np.uint8, offset=pos)
+    last = np.flatnonzero(b < 0x80)[:count]
+    b = b[:last[-1] + 1]
+    first = np.concatenate([[0], last[:-1] + 1])
+    # The position of each byte within its integer gives its shift.
+    shifts = np.arange(len(b)) - np.repeat(first, last - first + 1)
+    parts = (b & 0x7f).astype(np.uint64) << (7 * shifts).astype(np.uint64)
+    return np.add.reduceat(parts, first), pos + len(b)
+
+
+class SignatureReader(object):
+    """Read signatures from a file written by `write_signatures`.
+
+    The file is read into memory, but blocks are only decompressed when a
+    family in them is requested. The most recently decompressed block is
+    kept.
+
+    Parameters
+    ----------
+    hash_file : file_like
+        A file opened for reading bytes.
+    """
+    def __init__(self, hash_file):
+        contents = hash_file.read()
+        if contents[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a compressed signature file")
+        version = contents[len(MAGIC)]
+        if version > VERSION:
+            raise ValueError("Unsupported version {}".format(version))
+        (length,), pos = decode_varints(contents, len(MAGIC) + 1, 1)
+        header = json.loads(contents[pos:pos + length].decode())
+        self._data = memoryview(contents)[pos + length:]
+        self.n = header["n"]
+        self.hash_bits = header.get("hash_bits", 32)
+        self.element = header["element"]
+        offset, size, count = header["accessions"]
+        accessions = zlib.decompress(self._data[offset:offset + size])
+        self.accessions = accessions.decode().split("\n") if count else []
+        self._blocks = [(offset, size, families)
+                        for offset, size, families in header["blocks"]]
+        self._block_of = {f: i for i, (_, _, families)
+                          in enumerate(self._blocks) for f in families}
+        self._cached = (None, None)
+
+    @property
+    def families(self):
+        """Get the family accessions in the file, in order.
+
+        Returns
+        -------
+        list of str
+        """
+        return [f for _, _, families in self._blocks for f in families]
+
+    def __len__(self):
+        return len(self._block_of)
+
+    def __contains__(self, family):
+        return family in self._block_of
+
+    def __getitem__(self, family):
+        """Get the signature of a family.
+
+        Parameters
+        ----------
+        family : str
+
+        Returns
+        -------
+        set of (int, object)
+            A signature, as returned by `minhash.signature`.
+        """
+        i = self._block_of[family]
+        return self._block(i)[self._blocks[i][2].index(family)]
+
+    def __iter__(self):
+        """Iterate over family accessions and signatures, in order."""
+        for i, (_, _, families) in enumerate(self._blocks):
+            yield from zip(families, self._block(i))
+
+    def _block(self, i):
+        if self._cached[0] != i:
+            offset, size, families = self._blocks[i]
+            data = zlib.decompress(self._data[offset:offset + size])
+            self._cached = (i, self._decode_block(data, len(families)))
+        return self._cached[1]
+
+    def _decode_block(self, data, count):
+        lengths, pos = decode_varints(data, 0, count)
+        total = sum(lengths)
+        deltas, pos = decode_varint_array(data, pos, total)
+        ids, pos = decode_varint_array(data, pos, total)
+        # Undo the delta encoding of all signatures at once, then remove the
+        # running total carried over from the signatures before each one.
+        ends = np.cumsum(lengths, dtype=np.int64)
+        starts = ends - lengths
+        totals = np.cumsum(deltas, dtype=np.uint64)
+        carried = np.zeros(count, dtype=np.uint64)
+        if total > 0:
+            carried[starts > 0] = totals[starts[starts > 0] - 1]
+        hashes = (totals - np.repeat(carried, lengths)).tolist()
+        elements = [self.accessions[i] for i in ids.tolist()]
+        if self.element == ELEMENT_CHUNK:
+            chunks, pos = decode_varint_array(data, pos, total)
+            elements = list(zip(elements, chunks.tolist()))
+        signatures = []
+        start = 0
+        for end in ends.tolist():
+            signatures.append(set(zip(hashes[start:end], elements[start:end])))
+            start = end
+        return signatures
+
+
+def read_signatures(hash_file):
+    """Read all of the signatures in a file written by `write_signatures`.
+
+    Parameters
+    ----------
+    hash_file : file_like
+        A file opened for reading bytes.
+
+    Returns
+    -------
+    dict
+        Signatures keyed by family accession.
+    """
+    return dict(SignatureReader(hash_file))
+
+
+def is_binary(hash_file):
+    """Check whether a file was opened for reading bytes.
+
+    Parameters
+    ----------
+    hash_file : file_like
+
+    Returns
+    -------
+    bool
+    """
+    return isinstance(hash_file.read(0), bytes)
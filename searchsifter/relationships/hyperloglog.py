@@ -0,0 +1,177 @@
+"""Estimate the cardinality of sets with HyperLogLog sketches."""
+import base64
+import numpy as np
+from . import minhash as mh
+
+
+class HyperLogLog(object):
+    """
+    A HyperLogLog sketch of a set.
+
+    The sketch has `2 ** p` registers, and estimates the number of distinct
+    elements added to it with a relative standard error of about
+    `1.04 / sqrt(2 ** p)`. Sketches with the same `p` can be combined to
+    estimate the cardinality of unions, and, by inclusion-exclusion, of
+    intersections.
+
+    Parameters
+    ----------
+    p : int
+        The precision, between 4 and 18.
+    """
+    def __init__(self, p=12, _registers=None):
+        if not 4 <= p <= 18:
+            raise ValueError("p must be between 4 and 18")
+        self.p = p
+        if _registers is None:
+            _registers = np.zeros(1 << p, dtype=np.uint8)
+        self.registers = _registers
+
+    @classmethod
+    def from_elements(cls, s, p=12):
+        """
+        Create a sketch of an iterable.
+
+        Parameters
+        ----------
+        s : iterable
+        p : int
+
+        Returns
+        -------
+        HyperLogLog
+        """
+        sketch = cls(p)
+        sketch.update(s)
+        return sketch
+
+    def update(self, s):
+        """
+        Add the elements of an iterable to the sketch.
+
+        Parameters
+        ----------
+        s : iterable
+        """
+        self.update_hashes(np.fromiter((mh.hash64(e) for e in s),
+                                       dtype=np.uint64))
+
+    def update_hashes(self, hashes):
+        """
+        Add elements to the sketch by their 64 bit hashes.
+
+        Parameters
+        ----------
+        hashes : numpy.ndarray of uint64
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        q = 64 - self.p
+        index = (hashes >> np.uint64(q)).astype(np.intp)
+        rest = hashes & np.uint64((1 << q) - 1)
+        # The rank is the position of the leftmost 1 bit in the q bits left
+        # once the register index is removed.
+        rank = (q - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def cardinality(self):
+        """
+        Estimate the number of distinct elements added to the sketch.
+
+        Returns
+        -------
+        float
+        """
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            # Use linear counting for small cardinalities.
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def __len__(self):
+        return int(round(self.cardinality()))
+
+    def __or__(self, other):
+        """Get the sketch of the union of two sets."""
+        self._check_compatible(other)
+        return type(self)(self.p, np.maximum(self.registers, other.registers))
+
+    def union(self, *others):
+        """
+        Get the sketch of the union of this and other sets.
+
+        Parameters
+        ----------
+        others : HyperLogLog
+
+        Returns
+        -------
+        HyperLogLog
+        """
+        registers = self.registers.copy()
+        for other in others:
+            self._check_compatible(other)
+            np.maximum(registers, other.registers, out=registers)
+        return type(self)(self.p, registers)
+
+    def intersection_cardinality(self, other):
+        """
+        Estimate the number of elements in both this set and another.
+
+        This is computed by inclusion-exclusion, so its error is relative to
+        the size of the union, not of the intersection.
+
+        Parameters
+        ----------
+        other : HyperLogLog
+
+        Returns
+        -------
+        float
+        """
+        union = (self | other).cardinality()
+        return max(0.0, self.cardinality() + other.cardinality() - union)
+
+    def _check_compatible(self, other):
+        if self.p != other.p:
+            raise ValueError("Sketches have different precisions")
+
+    def to_string(self):
+        """
+        Encode the sketch as a string.
+
+        Returns
+        -------
+        str
+        """
+        return base64.b64encode(self.registers.tobytes()).decode("ascii")
+
+    @classmethod
+    def from_string(cls, s, p):
+        """
+        Decode a sketch encoded by `to_string`.
+
+        Parameters
+        ----------
+        s : str
+        p : int
+
+        Returns
+        -------
+        HyperLogLog
+        """
+        registers = np.frombuffer(base64.b64decode(s), dtype=np.uint8).copy()
+        return cls(p, registers)
+
+
+def _bit_length(x):
+    # The number of bits needed to represent each element of a uint64 array.
+    x = x.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >= np.uint64(1 << shift)
+        length[high] += shift
+        x[high] >>= np.uint64(shift)
+    return length + (x > 0)
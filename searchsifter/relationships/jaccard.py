@@ -1,4 +1,5 @@
 """Calculate Jaccard Index and Containment between sets."""
+import numpy as np
 
 
 def _zero_on_divide_by_zero(func):
@@ -46,3 +47,173 @@ def jaccard_containment(s, t):
     """
     s_, t_ = set(s), set(t)
     return len(s_ & t_) / len(s_)
+
+
+class ResidueSpace(object):
+    """
+    A coordinate space in which residues of any protein have a unique
+    integer coordinate.
+
+    Each protein is allocated a block of coordinates when it is first seen,
+    large enough for any residue number below `2 ** block_bits`.
+
+    Parameters
+    ----------
+    block_bits : int
+    """
+    def __init__(self, block_bits=20):
+        self.block_bits = block_bits
+        self._blocks = {}
+
+    def offset(self, acc):
+        """
+        Get the coordinate of residue 0 of a protein.
+
+        Parameters
+        ----------
+        acc : str
+
+        Returns
+        -------
+        int
+        """
+        try:
+            block = self._blocks[acc]
+        except KeyError:
+            block = len(self._blocks)
+            self._blocks[acc] = block
+        return block << self.block_bits
+
+    def encode(self, family):
+        """
+        Get the residues covered by a Family.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+
+        Returns
+        -------
+        RunLengthSet
+
+        Raises
+        ------
+        ValueError
+            If a region has a coordinate which is negative, or not below
+            `2 ** block_bits`.
+        """
+        regions = list(family.regions())
+        offsets = np.array([self.offset(acc) for acc, _, _ in regions],
+                           dtype=np.int64)
+        starts = np.array([s for _, s, _ in regions], dtype=np.int64)
+        ends = np.array([e for _, _, e in regions], dtype=np.int64)
+        # Coordinates out of range would alias into another protein's block.
+        if np.any(starts < 0) or np.any(ends >= 1 << self.block_bits):
+            raise ValueError("Region coordinates must be in [0, 2 ** {})"
+                             .format(self.block_bits))
+        return RunLengthSet(offsets + starts, offsets + ends + 1)
+
+
+class RunLengthSet(object):
+    """
+    A set of integers, stored as sorted runs of consecutive integers.
+
+    Intersection and union cardinalities are computed from the runs, in time
+    proportional to the number of runs rather than the number of integers.
+
+    Parameters
+    ----------
+    starts, ends : array_like of int
+        The first integer in each run, and one more than the last. Runs may
+        overlap, and need not be sorted.
+    """
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        if len(starts) > 0:
+            # A new run begins wherever a start lies beyond every end before
+            # it. Overlapping and adjacent runs are merged.
+            reach = np.maximum.accumulate(ends)
+            new_run = np.concatenate([[True], starts[1:] > reach[:-1]])
+            first = np.flatnonzero(new_run)
+            starts = starts[first]
+            ends = np.maximum.reduceat(ends, first)
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return int((self.ends - self.starts).sum())
+
+    def intersection_cardinality(self, other):
+        """
+        Count the integers in both this set and another.
+
+        Parameters
+        ----------
+        other : RunLengthSet
+
+        Returns
+        -------
+        int
+        """
+        # Sweep over the boundaries of both sets' runs, counting the length
+        # of the stretches covered by a run from each.
+        coords = np.concatenate([self.starts, other.starts,
+                                 self.ends, other.ends])
+        deltas = np.concatenate([np.ones(len(self.starts) + len(other.starts),
+                                         dtype=np.int64),
+                                 -np.ones(len(self.ends) + len(other.ends),
+                                          dtype=np.int64)])
+        order = np.argsort(coords, kind="stable")
+        coords, deltas = coords[order], deltas[order]
+        coverage = np.cumsum(deltas)[:-1]
+        lengths = np.diff(coords)
+        return int(lengths[coverage == 2].sum())
+
+    def union_cardinality(self, other):
+        """
+        Count the integers in either this set or another.
+
+        Parameters
+        ----------
+        other : RunLengthSet
+
+        Returns
+        -------
+        int
+        """
+        return len(self) + len(other) - self.intersection_cardinality(other)
+
+    @_zero_on_divide_by_zero
+    def jaccard(self, other):
+        """
+        Calculate the Jaccard Index of this set and another.
+
+        Parameters
+        ----------
+        other : RunLengthSet
+
+        Returns
+        -------
+        float
+        """
+        return self.intersection_cardinality(other) / self.union_cardinality(other)
+
+    @_zero_on_divide_by_zero
+    def jaccard_containment(self, other):
+        """
+        Calculate the Jaccard Containment of this set and another.
+
+        C(S, T) = |S ^ T| / |S|
+
+        Parameters
+        ----------
+        other : RunLengthSet
+
+        Returns
+        -------
+        float
+        """
+        return self.intersection_cardinality(other) / len(self)
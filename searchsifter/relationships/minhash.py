@@ -1,7 +1,12 @@
 """Generate and compare MinHash signatures."""
 import binascii
+import bisect
 from functools import reduce
+import hashlib
+import heapq
+import numbers
 import operator
+import numpy as np
 from .jaccard import _zero_on_divide_by_zero
 
 
@@ -9,6 +14,72 @@ def _crc32_hash(e):
     return binascii.crc32(str(e).encode())
 
 
+_GOLDEN_GAMMA = np.uint64(0x9e3779b97f4a7c15)
+
+
+def _mix64(x):
+    # The splitmix64 finaliser, applied to every element of a uint64 array.
+    x = np.asarray(x, dtype=np.uint64)
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _blake64(e):
+    return int.from_bytes(hashlib.blake2b(str(e).encode(),
+                                          digest_size=8).digest(), "little")
+
+
+def hash64(e):
+    """
+    Compute a 64 bit hash of an object.
+
+    (str, int) tuples, such as (protein accession, chunk) are hashed
+    consistently with `hash64_pairs`. NumPy integers hash as the equal
+    Python int.
+
+    Parameters
+    ----------
+    e : object
+
+    Returns
+    -------
+    int
+    """
+    if isinstance(e, tuple) and len(e) == 2 and \
+            isinstance(e[1], numbers.Integral):
+        return int(hash64_pairs(e[0], np.array([int(e[1])]))[0])
+    if isinstance(e, numbers.Integral):
+        e = int(e)
+    return _blake64(e)
+
+
+def hash64_pairs(first, seconds):
+    """
+    Compute 64 bit hashes of several tuples which share their first element.
+
+    The first element is hashed once, and combined with each of the second
+    elements using vectorised integer arithmetic.
+
+    Parameters
+    ----------
+    first : object
+        The first element of every tuple.
+    seconds : numpy.ndarray of int
+        The second element of each tuple.
+
+    Returns
+    -------
+    numpy.ndarray of uint64
+        Hashes equal to those computed by `hash64` for each tuple.
+    """
+    seconds = np.asarray(seconds).astype(np.uint64)
+    return _mix64(np.uint64(_blake64(first)) ^
+                  _mix64(seconds + _GOLDEN_GAMMA))
+
+
 def signature(s, n, hash_function=_crc32_hash):
     """
     Calculate the set signature of an iterable.
@@ -30,6 +101,507 @@ def signature(s, n, hash_function=_crc32_hash):
     return set(sorted((hash_function(e), e) for e in s)[:n])
 
 
+class BottomKSketch(object):
+    """
+    A signature which can be updated as elements are added to the set.
+
+    The signature is always equal to that returned by `signature` for all of
+    the elements added so far. Adding elements costs time in proportion to
+    the number of elements added, not the size of the whole set.
+
+    Parameters
+    ----------
+    n : int
+        Signature length.
+    hash_function : function
+        The hash function to use. By default, CRC32.
+    """
+    def __init__(self, n, hash_function=_crc32_hash):
+        self.n = n
+        self.hash_function = hash_function
+        self._sorted = []
+        self._members = set()
+
+    @classmethod
+    def from_signature(cls, sig, n, hash_function=_crc32_hash):
+        """
+        Create a sketch from the signature of a set.
+
+        Parameters
+        ----------
+        sig : iterable of (int, object)
+            A signature of length `n`, as returned by `signature`.
+        n : int
+            Signature length.
+        hash_function : function
+            The hash function with which the signature was made. By default,
+            CRC32.
+
+        Returns
+        -------
+        BottomKSketch
+        """
+        sketch = cls(n, hash_function)
+        sketch._sorted = sorted(sig)
+        sketch._members = set(sketch._sorted)
+        return sketch
+
+    def update(self, s):
+        """
+        Add the elements of an iterable to the sketch.
+
+        Parameters
+        ----------
+        s : iterable
+        """
+        for e in s:
+            item = (self.hash_function(e), e)
+            # An element which is already present is either in the sketch, or
+            # was, or would have been, pushed out by smaller hashes.
+            if len(self._sorted) == self.n and item >= self._sorted[-1]:
+                continue
+            if item in self._members:
+                continue
+            bisect.insort(self._sorted, item)
+            self._members.add(item)
+            if len(self._sorted) > self.n:
+                self._members.discard(self._sorted.pop())
+
+    def signature(self):
+        """
+        Get the signature of the elements added so far.
+
+        Returns
+        -------
+        set of int
+            The signature as a set.
+        """
+        return set(self._members)
+
+
+_EMPTY_BIN = np.uint64(1 << 32)
+
+
+class OnePermutationSketch(object):
+    """
+    A fixed length signature made by one permutation hashing.
+
+    Each 64 bit element hash is assigned to one of `k` bins by its high bits,
+    and each bin keeps the smallest of the low 32 bits of the hashes assigned
+    to it. Empty bins are filled by optimal densification, borrowing the value
+    of a non-empty bin chosen by a hash of the empty bin's position, so every
+    element of the signature is meaningful.
+
+    Parameters
+    ----------
+    k : int
+        The number of bins, i.e., the signature length.
+    b : int, optional
+        If given, only the lowest `b` bits of each bin are kept in the
+        signature.
+    """
+    def __init__(self, k, b=None):
+        if b is not None and not 1 <= b <= 32:
+            raise ValueError("b must be between 1 and 32")
+        self.k = k
+        self.b = b
+        self._bins = np.full(k, _EMPTY_BIN, dtype=np.uint64)
+
+    def update(self, s):
+        """
+        Add the elements of an iterable to the sketch.
+
+        Parameters
+        ----------
+        s : iterable
+        """
+        self.update_hashes(np.fromiter((hash64(e) for e in s),
+                                       dtype=np.uint64))
+
+    def update_hashes(self, hashes):
+        """
+        Add elements to the sketch by their 64 bit hashes.
+
+        Parameters
+        ----------
+        hashes : numpy.ndarray of uint64
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bins = ((hashes >> np.uint64(32)) % np.uint64(self.k)).astype(np.intp)
+        np.minimum.at(self._bins, bins, hashes & np.uint64(0xffffffff))
+
+    def signature(self):
+        """
+        Get the signature of the elements added so far.
+
+        Returns
+        -------
+        numpy.ndarray
+            `k` unsigned integers, of the smallest type holding `b` bits.
+        """
+        signature = _densify(self._bins)
+        signature[signature == _EMPTY_BIN] = 0
+        if self.b is None:
+            return signature.astype(np.uint32)
+        signature &= np.uint64((1 << self.b) - 1)
+        return signature.astype(_bbit_dtype(self.b))
+
+
+def one_permutation_signature(hashes, k, b=None):
+    """
+    Compute the one permutation signature of a set from its 64 bit hashes.
+
+    Parameters
+    ----------
+    hashes : numpy.ndarray of uint64
+    k : int
+        Signature length.
+    b : int, optional
+        The number of bits kept from each bin.
+
+    Returns
+    -------
+    numpy.ndarray
+        See `OnePermutationSketch.signature`.
+    """
+    sketch = OnePermutationSketch(k, b)
+    sketch.update_hashes(hashes)
+    return sketch.signature()
+
+
+def one_permutation_jaccard(signatures, t, b=None):
+    """
+    Estimate the Jaccard index between sets from one permutation signatures.
+
+    Parameters
+    ----------
+    signatures : numpy.ndarray
+        A signature, or a 2D array with one signature per row.
+    t : numpy.ndarray
+        A signature.
+    b : int, optional
+        The number of bits kept from each bin. Matches between b-bit values
+        are corrected for those expected by chance.
+
+    Returns
+    -------
+    float or numpy.ndarray
+        The estimates, one for each row of `signatures`.
+    """
+    matches = np.mean(np.asarray(signatures) == t, axis=-1)
+    if b is None:
+        return matches
+    chance = 2.0 ** -b
+    return np.maximum(matches - chance, 0) / (1 - chance)
+
+
+def _densify(bins):
+    # Fill each empty bin from the first non-empty bin in a sequence of bins
+    # chosen by hashing the empty bin's position with an attempt number.
+    k = len(bins)
+    dense = bins.copy()
+    empty = np.flatnonzero(bins == _EMPTY_BIN)
+    if len(empty) == k:
+        return dense
+    attempt = 0
+    while len(empty) > 0:
+        attempt += 1
+        keys = (empty.astype(np.uint64) << np.uint64(32)) | np.uint64(attempt)
+        donors = (_mix64(keys) % np.uint64(k)).astype(np.intp)
+        filled = bins[donors] != _EMPTY_BIN
+        dense[empty[filled]] = bins[donors[filled]]
+        empty = empty[~filled]
+    return dense
+
+
+def _bbit_dtype(b):
+    if b <= 8:
+        return np.uint8
+    if b <= 16:
+        return np.uint16
+    return np.uint32
+
+
+class WeightedSketch(object):
+    """
+    A weighted MinHash signature made by improved consistent weighted sampling.
+
+    Each position of the signature samples one element, with probability
+    proportional to its weight, together with a quantised weight. Two
+    signatures agree at a position with probability equal to the weighted
+    Jaccard index of their sets.
+
+    All random values are derived by hashing, so the signature of a set
+    doesn't depend on the order in which elements were added. An element's
+    weight may be increased by updating it again with its new weight.
+
+    Parameters
+    ----------
+    n : int
+        Signature length.
+    """
+    # The number of elements sampled at once, bounding the memory used.
+    _block_size = 4096
+
+    def __init__(self, n):
+        self.n = n
+        self._log_a = np.full(n, np.inf)
+        self._samples = np.zeros(n, dtype=np.uint64)
+        # Five independent random values are needed per element and
+        # position.
+        self._streams = _mix64(np.arange(5 * n, dtype=np.uint64) +
+                               _GOLDEN_GAMMA)
+
+    def update(self, weights):
+        """
+        Add weighted elements to the sketch.
+
+        Parameters
+        ----------
+        weights : iterable of (object, float)
+            Elements and their total weights, which must be positive.
+        """
+        weights = list(weights)
+        if weights:
+            self.update_weights(*zip(*weights))
+
+    def update_weights(self, elements, weights):
+        """
+        Add weighted elements to the sketch.
+
+        Parameters
+        ----------
+        elements : sequence
+        weights : sequence of float
+            The total weight of each element, which must be positive.
+        """
+        keys = np.array([hash64(e) for e in elements], dtype=np.uint64)
+        weights = np.asarray(weights, dtype=np.float64)
+        for start in range(0, len(keys), self._block_size):
+            stop = start + self._block_size
+            self._update_block(keys[start:stop], weights[start:stop])
+
+    def _update_block(self, keys, weights):
+        # Draw uniform values in (0, 1) from the top 53 bits of hashes of
+        # each element with each stream.
+        bits = _mix64(keys[:, None] ^ self._streams[None, :]) >> np.uint64(11)
+        u = (bits.astype(np.float64) + 0.5) * 2.0 ** -53
+        u = u.reshape(len(keys), 5, self.n)
+        r = -np.log(u[:, 0] * u[:, 1])
+        c = -np.log(u[:, 2] * u[:, 3])
+        beta = u[:, 4]
+        t = np.floor(np.log(weights)[:, None] / r + beta)
+        log_a = np.log(c) - r * (t - beta + 1)
+        best = np.argmin(log_a, axis=0)
+        positions = np.arange(self.n)
+        log_a = log_a[best, positions]
+        better = log_a < self._log_a
+        t = t[best, positions].astype(np.int64).view(np.uint64)
+        samples = _mix64(keys[best] ^ _mix64(t + _GOLDEN_GAMMA))
+        self._log_a[better] = log_a[better]
+        self._samples[better] = samples[better]
+
+    def signature(self):
+        """
+        Get the signature of the elements added so far.
+
+        Returns
+        -------
+        numpy.ndarray of uint64
+        """
+        return self._samples.copy()
+
+
+# Pads rows of signature matrices, and sorts after every hash.
+SIGNATURE_PAD = np.uint64(0xffffffffffffffff)
+
+
+def signature_array(sig):
+    """
+    Convert a signature to a sorted array of its hashes.
+
+    Parameters
+    ----------
+    sig : iterable of (int, object)
+        A signature, as returned by `signature`.
+
+    Returns
+    -------
+    numpy.ndarray of uint64
+    """
+    return np.array(sorted(h for h, _ in sig), dtype=np.uint64)
+
+
+def signature_matrix(sigs, n):
+    """
+    Stack signatures as the rows of a matrix of their sorted hashes.
+
+    Parameters
+    ----------
+    sigs : list of iterable of (int, object)
+        Signatures, as returned by `signature`.
+    n : int
+        Signature length. Shorter signatures are padded with
+        `SIGNATURE_PAD`.
+
+    Returns
+    -------
+    numpy.ndarray of uint64
+    """
+    matrix = np.full((len(sigs), n), SIGNATURE_PAD, dtype=np.uint64)
+    for row, sig in zip(matrix, sigs):
+        hashes = signature_array(sig)[:n]
+        row[:len(hashes)] = hashes
+    return matrix
+
+
+def sorted_minhash(signatures, t, n):
+    """
+    Calculate MinHash estimates of the Jaccard index from sorted hashes.
+
+    This is equivalent to `minhash` for each row of `signatures`, unless
+    distinct elements share a hash.
+
+    Parameters
+    ----------
+    signatures : numpy.ndarray of uint64
+        A matrix of signatures, as returned by `signature_matrix`.
+    t : numpy.ndarray of uint64
+        A signature, as returned by `signature_array`.
+    n : int
+        Signature length.
+
+    Returns
+    -------
+    numpy.ndarray of float
+        The estimate for each row of `signatures`.
+    """
+    signatures = np.asarray(signatures, dtype=np.uint64)
+    t = np.broadcast_to(np.asarray(t, dtype=np.uint64),
+                        (len(signatures), len(t)))
+    both = np.sort(np.concatenate([signatures, t], axis=1), axis=1)
+    valid = both != SIGNATURE_PAD
+    repeat = np.zeros_like(valid)
+    repeat[:, 1:] = valid[:, 1:] & (both[:, 1:] == both[:, :-1])
+    first = valid & ~repeat
+    # The position in the union of every hash, which for the second copy of
+    # a shared hash is the position of the first.
+    rank = np.cumsum(first, axis=1) - 1
+    shared = np.sum(repeat & (rank < n), axis=1)
+    union = np.minimum(np.sum(first, axis=1), n)
+    return shared / np.maximum(union, 1)
+
+
+def sorted_containment(signatures, t):
+    """
+    Calculate MinHash estimates of the Jaccard containment from sorted hashes.
+
+    This is equivalent to `minhash_containment` for each row of
+    `signatures`, unless distinct elements share a hash.
+
+    Parameters
+    ----------
+    signatures : numpy.ndarray of uint64
+        A matrix of signatures, as returned by `signature_matrix`.
+    t : numpy.ndarray of uint64
+        The sorted hashes of a set, such as a full hash.
+
+    Returns
+    -------
+    numpy.ndarray of float
+        The estimate for each row of `signatures`.
+    """
+    signatures = np.asarray(signatures, dtype=np.uint64)
+    t = np.asarray(t, dtype=np.uint64)
+    lengths = np.sum(signatures != SIGNATURE_PAD, axis=1)
+    if len(t) == 0:
+        return np.zeros(len(signatures))
+    positions = np.minimum(np.searchsorted(t, signatures), len(t) - 1)
+    shared = np.sum(t[positions] == signatures, axis=1)
+    return shared / np.maximum(lengths, 1)
+
+
+try:
+    from . import _minhash_kernels
+    COMPILED_KERNELS = True
+except ImportError:
+    _minhash_kernels = None
+    COMPILED_KERNELS = False
+
+
+def jaccard_rows(signatures, t, n):
+    """
+    Calculate MinHash estimates of the Jaccard index from sorted hashes.
+
+    This gives the same results as `sorted_minhash`, using the compiled
+    kernels if they have been built (see `COMPILED_KERNELS`).
+
+    Parameters
+    ----------
+    signatures : numpy.ndarray of uint64
+    t : numpy.ndarray of uint64
+    n : int
+        See `sorted_minhash`.
+
+    Returns
+    -------
+    numpy.ndarray of float
+    """
+    if _minhash_kernels is None:
+        return sorted_minhash(signatures, t, n)
+    return _minhash_kernels.jaccard_rows(
+        np.ascontiguousarray(signatures, dtype=np.uint64),
+        np.ascontiguousarray(t, dtype=np.uint64), n)
+
+
+def containment_rows(signatures, t):
+    """
+    Calculate MinHash estimates of the Jaccard containment from sorted hashes.
+
+    This gives the same results as `sorted_containment`, using the compiled
+    kernels if they have been built (see `COMPILED_KERNELS`).
+
+    Parameters
+    ----------
+    signatures : numpy.ndarray of uint64
+    t : numpy.ndarray of uint64
+        See `sorted_containment`.
+
+    Returns
+    -------
+    numpy.ndarray of float
+    """
+    if _minhash_kernels is None:
+        return sorted_containment(signatures, t)
+    return _minhash_kernels.containment_rows(
+        np.ascontiguousarray(signatures, dtype=np.uint64),
+        np.ascontiguousarray(t, dtype=np.uint64))
+
+
+def crc32_pair_hashes(first, seconds):
+    """
+    Hash several tuples which share their first element.
+
+    Each hash is equal to that computed by the default hash function for the
+    tuple `(first, second)`, but the common prefix of the tuples is only
+    hashed once.
+
+    Parameters
+    ----------
+    first : object
+        The first element of every tuple.
+    seconds : iterable of int
+        The second element of each tuple.
+
+    Returns
+    -------
+    list of int
+    """
+    prefix = binascii.crc32("({!r}, ".format(first).encode())
+    return [binascii.crc32("{})".format(second).encode(), prefix)
+            for second in seconds]
+
+
 def set_hashes(s, hash_function=_crc32_hash):
     """
     Compute and return hashes for every element of an iterable.
@@ -69,6 +641,35 @@ def union_signature(*args):
         return set(sorted(reduce(operator.or_, list(sets)))[:n])
 
 
+def merge_signatures(signatures, n):
+    """
+    Calculate the signature of the union of several sets by merging their
+    sorted signatures.
+
+    Unlike `union_signature`, the signatures are not combined and re-sorted.
+    A single k-way merge is made over them, which stops as soon as `n`
+    distinct elements have been seen.
+
+    Parameters
+    ----------
+    signatures : iterable of iterable
+        Set signatures, each sorted in ascending order.
+    n : int
+        Signature length.
+
+    Returns
+    -------
+    set
+        The signature of the union.
+    """
+    out = set()
+    for e in heapq.merge(*signatures):
+        if len(out) == n:
+            break
+        out.add(e)
+    return out
+
+
 def intersection_signature(*sets):
     """
     Calculate the signature of the intersection of two sets from their
@@ -1,13 +1,73 @@
 """Generate MinHash signatures from Pfam, or load from disk.
 """
+import copy
+import heapq
 import json
+import numpy as np
 from searchsifter.relationships import minhash as mh
 from ..Family import Family
-from collections import defaultdict
+from collections import defaultdict, Counter, namedtuple
+from functools import partial
+from types import MappingProxyType
+from . import codec
 from . import pfam_db
+from .hyperloglog import HyperLogLog
 
 pfam_db = None
 
+HASH_BITS = (32, 64)
+# The version of the JSON signature file format which records the hash width.
+HASH_FILE_VERSION = 2
+
+METRIC_JACCARD = "jaccard"
+METRIC_CONTAINMENT = "containment"
+
+ThresholdScores = namedtuple("ThresholdScores", ["scores", "max_score"])
+
+
+class _ArrayScores(object):
+    """The scoring methods of `Hashes`, from arrays of scores.
+
+    For classes which score a family against every Pfam family at once.
+    Subclasses implement `_scores(family, metric)`, returning a list of Pfam
+    family accessions and an array of their scores, and may override
+    `_scores_many` to score several families at once.
+    """
+    def _scores_many(self, families, metric):
+        return [self._scores(family, metric) for family in families]
+
+    def estimate_jaccard(self, family):
+        """See `Hashes.estimate_jaccard`."""
+        return self.estimate_jaccard_many([family])[0]
+
+    def estimate_containment(self, family):
+        """See `Hashes.estimate_containment`."""
+        return self.estimate_containment_many([family])[0]
+
+    def estimate_jaccard_many(self, families):
+        """See `Hashes.estimate_jaccard_many`."""
+        return [dict(zip(accs, scores.tolist())) for accs, scores
+                in self._scores_many(families, METRIC_JACCARD)]
+
+    def estimate_containment_many(self, families):
+        """See `Hashes.estimate_containment_many`."""
+        return [dict(zip(accs, scores.tolist())) for accs, scores
+                in self._scores_many(families, METRIC_CONTAINMENT)]
+
+    def estimate_above(self, family, threshold, metric=METRIC_JACCARD):
+        """See `Hashes.estimate_above`."""
+        accs, scores = self._scores(family, metric)
+        selected = np.flatnonzero((scores >= threshold) & (scores > 0))
+        max_score = float(scores.max()) if len(scores) > 0 else 0
+        return ThresholdScores({accs[i]: float(scores[i]) for i in selected},
+                               max_score)
+
+    def top_k(self, family, k, metric=METRIC_JACCARD):
+        """See `Hashes.top_k`."""
+        accs, scores = self._scores(family, metric)
+        best = np.argsort(-scores, kind="stable")[:max(k, 0)]
+        return [(accs[i], float(scores[i])) for i in best if scores[i] > 0]
+
 
 class Hashes(object):
     """Generate or load Pfam MinHash signatures from disk.
@@ -24,8 +84,8 @@ class Hashes(object):
         The signature length. If `from_file` is specified, signatures will be
         truncated to length `n`.
     from_file : file_like
-        A JSON encoded file produced by `save_to_file` from which signatures
-        should be loaded.
+        A file produced by `save_to_file` from which signatures should be
+        loaded. JSON files are opened as text, and compressed files as bytes.
     pfam : module
         The module which should be used for loading Pfam data, i.e., pfam_db
         or pfam_file.
@@ -34,13 +94,34 @@ class Hashes(object):
         module providing Pfam data. If using the MySQL database, this should
         be empty, if using the flat file it should contain the filename of the
         file.
+    release : str, optional
+        The Pfam release from which the signatures were generated.
+    hash_bits : int
+        The width of the hashes, 32 or 64. 32 bit hashes are CRC32 checksums,
+        and 64 bit hashes are computed by `minhash.hash64`, which collide far
+        less often in large families.
+    clans_args : list, optional
+        The args which should be supplied to the `Clans` constructor of the
+        module providing Pfam data. If using the MySQL database, this should
+        be empty, if using flat files it should contain the filename of the
+        Pfam clans file, and optionally its file type.
     """
-    def __init__(self, n=100, from_file=None, pfam=pfam_db, pfam_args=None, _hashes=None):
+    def __init__(self, n=100, from_file=None, pfam=pfam_db, pfam_args=None,
+                 _hashes=None, release=None, hash_bits=32, clans_args=None):
+        if hash_bits not in HASH_BITS:
+            raise ValueError("hash_bits must be one of {}".format(HASH_BITS))
         self.n = n
+        self.release = release
+        self.hash_bits = hash_bits
         if pfam_args is None:
             pfam_args = []
         self.pfam_args = pfam_args
+        if clans_args is None:
+            clans_args = []
+        self.clans_args = clans_args
         self.pfam = pfam
+        self._index = None
+        self._signature_matrix = None
         if from_file is not None:
             self.load_from_file(from_file)
         elif _hashes is not None:
@@ -48,6 +129,35 @@ class Hashes(object):
         else:
             self._hashes = None
 
+    @property
+    def key(self):
+        """Get a key identifying the configuration of these signatures.
+
+        Hashes objects with equal keys compute identical signatures for any
+        Family, so signatures can be shared between them.
+
+        Returns
+        -------
+        tuple
+            The hash function, window size (None for `Hashes`), signature
+            length and Pfam release.
+        """
+        return (self._hash_name, None, self.n, self.release)
+
+    @property
+    def _hash_name(self):
+        return "crc32" if self.hash_bits == 32 else "hash64"
+
+    @property
+    def hash_function(self):
+        """Get the function used to hash each element.
+
+        Returns
+        -------
+        function
+        """
+        return mh._crc32_hash if self.hash_bits == 32 else mh.hash64
+
     def __iter__(self):
         """Iterate over Pfam family accessions and family signatures.
 
@@ -76,30 +186,164 @@ class Hashes(object):
         if self._hashes is None:
             self._hashes = {}
             for family, proteins in self.pfam.Families(*self.pfam_args):
-                self._hashes[family] = mh.signature(proteins, self.n)
+                self._hashes[family] = mh.signature(proteins, self.n,
+                                                    self.hash_function)
         return self._hashes
 
-    def save_to_file(self, filename):
+    def save_to_file(self, filename, compress=False):
         """Save the signatures to a path.
 
         There must not already be a file located at `filename`
 
         Parameters
         ----------
-        filename : str"""
+        filename : str
+        compress : bool
+            If set, the signatures are saved in the compact binary format of
+            `codec.write_signatures`, rather than as JSON."""
+        if compress:
+            with open(filename, 'xb') as save_file:
+                codec.write_signatures(self.hashes, save_file, self.n,
+                                       hash_bits=self.hash_bits)
+            return
         with open(filename, 'x') as save_file:
-            json.dump({k: list(v) for k, v in self.hashes.items()}, save_file)
+            json.dump({"version": HASH_FILE_VERSION,
+                       "hash_bits": self.hash_bits,
+                       "signatures": {k: list(v)
+                                      for k, v in self.hashes.items()}},
+                      save_file)
 
     def load_from_file(self, hash_file, n=None):
         """Load the signatures from a file.
 
         Parameters
         ----------
-        hash_file : file_like"""
+        hash_file : file_like
+            A JSON file, or, if opened for reading bytes, a file written with
+            `compress` set.
+
+        Raises
+        ------
+        ValueError
+            If the file's hashes are not `hash_bits` wide."""
         if n is None:
             n = self.n
-        self._hashes = {f: set(map(tuple, sorted(p)[:n])) for f, p
-                        in json.load(hash_file).items()}
+        if codec.is_binary(hash_file):
+            reader = codec.SignatureReader(hash_file)
+            self._check_hash_bits(reader.hash_bits)
+            self._hashes = {f: set(sorted(p)[:n]) for f, p in reader}
+        else:
+            self._hashes = {f: set(map(tuple, sorted(p)[:n])) for f, p
+                            in self._load_json(hash_file).items()}
+        self._index = None
+
+    def _load_json(self, hash_file):
+        # Files without a version are from before the hash width was
+        # recorded, so hold CRC32 hashes.
+        data = json.load(hash_file)
+        if "version" not in data:
+            self._check_hash_bits(32)
+            return data
+        if data["version"] > HASH_FILE_VERSION:
+            raise ValueError("Unsupported version {}".format(data["version"]))
+        self._check_hash_bits(data["hash_bits"])
+        return data["signatures"]
+
+    def _check_hash_bits(self, hash_bits):
+        if hash_bits != self.hash_bits:
+            raise ValueError("The file holds {} bit hashes, not {} bit".format(
+                hash_bits, self.hash_bits))
+
+    @property
+    def index(self):
+        """Get an inverted index of the Pfam signatures.
+
+        The index is built on first use, and cached.
+
+        Returns
+        -------
+        dict
+            A dictionary keyed by signature elements, i.e. (hash, object)
+            tuples. The values are lists of the accessions of Pfam families
+            whose signatures contain the element.
+        """
+        if self._index is None:
+            index = defaultdict(list)
+            for acc, signature in self:
+                for e in signature:
+                    index[e].append(acc)
+            self._index = dict(index)
+        return self._index
+
+    def overlaps(self, elements):
+        """Count the elements shared with each Pfam signature.
+
+        Parameters
+        ----------
+        elements : iterable of (int, object)
+            Signature elements, for example a Family's signature or full hash.
+
+        Returns
+        -------
+        Counter
+            The number of shared elements, keyed by Pfam family accession.
+            Families sharing no elements are absent.
+        """
+        counts = Counter()
+        for e in elements:
+            for acc in self.index.get(e, ()):
+                counts[acc] += 1
+        return counts
+
+    def estimate_above(self, family, threshold, metric=METRIC_JACCARD):
+        """Find the Pfam families whose estimated score reaches a threshold.
+
+        This gives the same scores as `estimate_jaccard` or
+        `estimate_containment`, but only for families scoring at least
+        `threshold`. Families sharing no signature elements with `family` are
+        never scored. For the Jaccard index, families whose score is bounded
+        below `threshold` by the number of shared elements are not scored
+        exactly either. The containment is exact from the shared element
+        counts alone.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+        threshold : float
+        metric : str
+            `METRIC_JACCARD` or `METRIC_CONTAINMENT`.
+
+        Returns
+        -------
+        ThresholdScores
+            `scores` is a dictionary with `str` Pfam family accession keys,
+            and `float` scores of at least `threshold`. `max_score` is the
+            greatest score of any family if it is at least `threshold`,
+            otherwise it is only guaranteed to be below `threshold`.
+        """
+        scores = {}
+        max_score = 0
+        if metric == METRIC_JACCARD:
+            A = family.signature(self)
+            for acc, overlap in self.overlaps(A).items():
+                B = self.hashes[acc]
+                union_size = min(self.n, len(A) + len(B) - overlap)
+                if overlap / union_size < threshold:
+                    continue
+                score = mh.minhash(A, B, self.n)
+                max_score = max(max_score, score)
+                if score > 0 and score >= threshold:
+                    scores[acc] = score
+        elif metric == METRIC_CONTAINMENT:
+            B = family.full_hash(self)
+            for acc, overlap in self.overlaps(B).items():
+                score = overlap / len(self.hashes[acc])
+                max_score = max(max_score, score)
+                if score > 0 and score >= threshold:
+                    scores[acc] = score
+        else:
+            raise ValueError("Unknown metric {}".format(metric))
+        return ThresholdScores(scores, max_score)
 
     def estimate_jaccard(self, family):
         """Estimate the Jaccard index between a family and Pfam.
@@ -116,12 +360,7 @@ class Hashes(object):
         dict
             A dictionary with `str` Pfam family accession keys and `float`
             estimated Jaccard Index values."""
-        A = family.signature(self)
-        jaccards = {}
-
-        for acc, B in self:
-            jaccards[acc] = mh.minhash(A, B, self.n)
-        return jaccards
+        return self.estimate_jaccard_many([family])[0]
 
     def estimate_containment(self, family):
         """Estimate the Jaccard containment between a family and Pfam.
@@ -138,13 +377,145 @@ class Hashes(object):
         dict
             A dictionary with `str` Pfam family accession keys and `float`
             estimated Jaccard Containment values."""
-        B = family.full_hash(self)
-        containments = {}
+        return self.estimate_containment_many([family])[0]
+
+    def estimate_jaccard_many(self, families):
+        """Estimate the Jaccard index between several families and Pfam.
+
+        This is equivalent to calling `estimate_jaccard` for each family, but
+        the Pfam signatures are iterated over only once for the whole batch.
+        With 64 bit hashes, scores are computed from the sorted hashes of the
+        signatures, with `minhash.jaccard_rows`, as distinct elements sharing
+        a hash is then vanishingly unlikely.
+
+        Parameters
+        ----------
+        families : list of searchsifter.Family
+
+        Returns
+        -------
+        list of dict
+            For each family, a dictionary as returned by `estimate_jaccard`.
+        """
+        if self.hash_bits == 64:
+            accs, signatures = self.signature_matrix
+            return [dict(zip(accs, mh.jaccard_rows(
+                        signatures, mh.signature_array(family.signature(self)),
+                        self.n).tolist()))
+                    for family in families]
+        As = [family.signature(self) for family in families]
+        jaccards = [{} for _ in As]
+
+        for acc, B in self:
+            for A, family_jaccards in zip(As, jaccards):
+                family_jaccards[acc] = mh.minhash(A, B, self.n)
+        return jaccards
+
+    def estimate_containment_many(self, families):
+        """Estimate the Jaccard containment between several families and Pfam.
+
+        This is equivalent to calling `estimate_containment` for each family,
+        but the Pfam signatures are iterated over only once for the whole
+        batch. With 64 bit hashes, scores are computed from the sorted hashes
+        of the signatures, with `minhash.containment_rows`.
+
+        Parameters
+        ----------
+        families : list of searchsifter.Family
+
+        Returns
+        -------
+        list of dict
+            For each family, a dictionary as returned by
+            `estimate_containment`.
+        """
+        if self.hash_bits == 64:
+            accs, signatures = self.signature_matrix
+            return [dict(zip(accs, mh.containment_rows(
+                        signatures, mh.signature_array(family.full_hash(self))
+                        ).tolist()))
+                    for family in families]
+        Bs = [family.full_hash(self) for family in families]
+        containments = [{} for _ in Bs]
 
         for acc, A in self:
-            containments[acc] = mh.minhash_containment(A, B)
+            for B, family_containments in zip(Bs, containments):
+                family_containments[acc] = mh.minhash_containment(A, B)
         return containments
 
+    @property
+    def signature_matrix(self):
+        """Get the sorted hashes of the Pfam signatures as a matrix.
+
+        The matrix is cached until the signatures are replaced.
+
+        Returns
+        -------
+        accs : list of str
+            Pfam family accessions, in the order of the rows.
+        signatures : numpy.ndarray of uint64
+            As returned by `minhash.signature_matrix`.
+        """
+        hashes = self.hashes
+        if self._signature_matrix is None or \
+                self._signature_matrix[0] is not hashes or \
+                len(self._signature_matrix[1]) != len(hashes):
+            accs = list(hashes)
+            self._signature_matrix = (hashes, accs, mh.signature_matrix(
+                [hashes[acc] for acc in accs], self.n))
+        return self._signature_matrix[1:]
+
+    def top_k(self, family, k, metric=METRIC_JACCARD):
+        """Find the Pfam families with the highest estimated scores.
+
+        Only families sharing signature elements with `family` are
+        candidates. For the Jaccard index, candidates are scored in order of
+        their upper bound from the number of shared elements, and scoring
+        stops once no remaining candidate can enter the top `k`.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+        k : int
+        metric : str
+            `METRIC_JACCARD` or `METRIC_CONTAINMENT`.
+
+        Returns
+        -------
+        list of (str, float)
+            Up to `k` Pfam family accessions and their scores, highest score
+            first. Families scoring zero are not included, and if `k` is not
+            positive, the list is empty.
+        """
+        if k <= 0:
+            return []
+        if metric == METRIC_JACCARD:
+            A = family.signature(self)
+            candidates = []
+            for acc, overlap in self.overlaps(A).items():
+                B = self.hashes[acc]
+                union_size = min(self.n, len(A) + len(B) - overlap)
+                candidates.append((overlap / union_size, acc))
+            candidates.sort(reverse=True)
+            heap = []
+            for bound, acc in candidates:
+                if len(heap) == k and bound < heap[0][0]:
+                    break
+                score = mh.minhash(A, self.hashes[acc], self.n)
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, acc))
+                else:
+                    heapq.heappushpop(heap, (score, acc))
+            best = heap
+        elif metric == METRIC_CONTAINMENT:
+            B = family.full_hash(self)
+            best = ((overlap / len(self.hashes[acc]), acc)
+                    for acc, overlap in self.overlaps(B).items())
+        else:
+            raise ValueError("Unknown metric {}".format(metric))
+        return [(acc, score) for score, acc in heapq.nlargest(k, best)
+                if score > 0]
+
     def signature(self, family):
         """Get the MinHash signature for a Family.
 
@@ -159,32 +530,71 @@ class Hashes(object):
             the Pfam family. The second element is the object which was hashed
             to produce the signature. For example, a protein accession.
         """
-        return mh.signature(family.proteins(), self.n)
+        return mh.signature(family.proteins(), self.n, self.hash_function)
+
+    def sketch(self, family):
+        """Get a MinHash sketch for a Family, which can be updated.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+
+        Returns
+        -------
+        minhash.BottomKSketch
+            A sketch whose signature is that given by `signature`. Update it
+            with `elements` of new regions as they are added to the Family.
+        """
+        return mh.BottomKSketch.from_signature(self.signature(family), self.n,
+                                               self.hash_function)
+
+    def elements(self, regions):
+        """Get the objects which are hashed for some protein regions.
+
+        Parameters
+        ----------
+        regions : iterable of (str, int, int)
+            Protein accessions, and the start and end coordinates of regions.
+
+        Returns
+        -------
+        iterable
+            The objects to be hashed. For `Hashes`, these are protein
+            accessions. They may contain repeats.
+        """
+        return (acc for acc, _, _ in regions)
 
     def full_hash(self, family):
-        return mh.set_hashes(family.proteins())
+        return mh.set_hashes(family.proteins(), self.hash_function)
 
-    def clan_hashes(self):
+    def clan_hashes(self, clans=None):
         """Get a `Hashes` object containing signatures for clans.
 
         This is calculated as the union signature of families which are
-        members of the clan.
+        members of the clan. Only the family signatures are used, so no
+        family regions need to be loaded.
+
+        Parameters
+        ----------
+        clans : iterable of (str, set of str), optional
+            Clan accessions and the accessions of their member families. If
+            not given, clans are loaded using `pfam`.
 
         Returns
         -------
         Hashes
         """
-        chs = self._clan_hashes()
-        return type(self)(self.n, _hashes=chs)
+        chs = self._clan_hashes(clans)
+        return type(self)(self.n, _hashes=chs, hash_bits=self.hash_bits)
 
-    def _clan_hashes(self):
+    def _clan_hashes(self, clans=None):
+        if clans is None:
+            clans = self.pfam.Clans(*self.clans_args)
         chs = {}
-        for clan, members in self.pfam.Clans(*self.pfam_args):
-            hs = [self.hashes[f] for f in members if f in self.hashes]
-            if len(hs) == 1:
-                chs[clan] = hs[0]
-            elif len(hs) > 1:
-                chs[clan] = mh.union_signature(*(hs + [self.n]))
+        for clan, members in clans:
+            hs = [sorted(self.hashes[f]) for f in members if f in self.hashes]
+            if len(hs) > 0:
+                chs[clan] = mh.merge_signatures(hs, self.n)
         return chs
 
 
@@ -209,115 +619,1207 @@ class ResidueHashes(Hashes):
         The signature length. If `from_file` is specified, signatures will be
         truncated to length `n`.
     from_file : file_like
-        A JSON encoded file produced by `save_to_file` from which signatures
-        should be loaded.
+        A file produced by `save_to_file` from which signatures should be
+        loaded. JSON files are opened as text, and compressed files as bytes.
     """
     def __init__(self, w, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.w = w
 
+    @property
+    def key(self):
+        """See `Hashes.key`."""
+        return (self._hash_name, self.w, self.n, self.release)
+
     @property
     def hashes(self):
         """See `Hashes.hashes`."""
         if self._hashes is None:
             self._hashes = {}
             for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
-                ci = _chunk_iterator(regions, self.w)
-                self._hashes[family] = mh.signature(set(ci), self.n)
+                self._hashes[family] = _window_signatures(
+                    regions, [self.w], self.n, self.hash_bits)[self.w]
         return self._hashes
 
     def signature(self, family):
         """See `Hashes.signature`."""
-        return mh.signature(set(_chunk_iterator(family.regions(), self.w)),
-                            self.n)
+        return self.signatures_with_windows(family, [self.w], self.n,
+                                            self.hash_bits)[self.w]
+
+    @staticmethod
+    def signatures_with_windows(family, ws, n, hash_bits=32):
+        """Compute a Family's signatures for several window sizes at once.
+
+        The Family's regions are only iterated over once, and each chunk is
+        hashed once, however many windows it appears in.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+        ws : list of int
+            The window sizes.
+        n : int
+            The signature length.
+        hash_bits : int
+            The width of the hashes, 32 or 64.
+
+        Returns
+        -------
+        dict
+            Signatures, as returned by `signature`, keyed by window size.
+        """
+        return _window_signatures(family.regions(), ws, n, hash_bits)
+
+    def elements(self, regions):
+        """See `Hashes.elements`.
+
+        For `ResidueHashes`, the objects are (protein accession, chunk)
+        tuples."""
+        return _chunk_iterator(regions, self.w)
 
     def full_hash(self, family):
-        return mh.set_hashes(set(_chunk_iterator(family.regions(), self.w)))
+        accs, protein_ids, starts, ends = region_arrays(family.regions())
+        chunks = chunk_array(protein_ids, starts, ends, self.w)
+        hashes = _hash_chunk_array(accs, chunks, self.hash_bits)
+        return set(zip(hashes.tolist(), _unpack_chunks(accs, chunks)))
 
     def load_from_file(self, hash_file, n=None):
         """See `Hashes.load_from_file`."""
         if n is None:
             n = self.n
+        if codec.is_binary(hash_file):
+            return super().load_from_file(hash_file, n)
         self._hashes = {f: {(h, tuple(c)) for h, c in sorted(p)[:n]} for f, p
-                        in json.load(hash_file).items()}
+                        in self._load_json(hash_file).items()}
+        self._index = None
 
-    def clan_hashes(self):
-        return type(self)(self.w, self.n, _hashes=self._clan_hashes())
+    def clan_hashes(self, clans=None):
+        """See `Hashes.clan_hashes`."""
+        return type(self)(self.w, self.n, _hashes=self._clan_hashes(clans),
+                          hash_bits=self.hash_bits)
 
     @classmethod
-    def hashes_with_windows(cls, ws, n, pfam=pfam_db, pfam_args=None):
+    def hashes_with_windows(cls, ws, n, pfam=pfam_db, pfam_args=None,
+                            hash_bits=32, clans_args=None):
         """Create ResidueHashes objects with different values of `w`."""
         if pfam_args is None:
             pfam_args = []
-        hs = defaultdict(dict)
+        hs = {w: {} for w in ws}
         for family, regions in pfam.FamiliesRegions(*pfam_args):
-            for w in ws:
-                ci = _chunk_iterator(regions, w)
-                hs[w][family] = mh.signature(set(ci), n)
-        return {w: cls(w, n, _hashes=h) for w, h in hs.items()}
+            for w, signature in _window_signatures(regions, ws, n,
+                                                   hash_bits).items():
+                hs[w][family] = signature
+        return {w: cls(w, n, pfam=pfam, pfam_args=pfam_args, _hashes=h,
+                       hash_bits=hash_bits, clans_args=clans_args)
+                for w, h in hs.items()}
 
 
-class Sizes(object):
-    def __init__(self, from_file=None, pfam=pfam_db, pfam_args=None):
+class HashArrays(_ArrayScores):
+    """Pfam signatures held as sorted arrays of hashes only.
+
+    `Hashes` keeps the object hashed for every element of every signature,
+    but scoring needs only the hashes. Here, the signatures of all families
+    are rows of one matrix of sorted hashes (see `minhash.signature_matrix`),
+    taking 8 bytes per element. Scores are computed with
+    `minhash.jaccard_rows` and `minhash.containment_rows`, and are equal
+    to those of `Hashes` unless distinct elements share a hash.
+
+    The hashed objects may be saved to a sidecar file, for debugging, with
+    `save_to_file`, and looked up with `provenance`.
+
+    Parameters
+    ----------
+    hashes : Hashes
+        The `Hashes` object whose signatures are used, unless `from_file` is
+        given. It is also used to compute signatures of queries, so if
+        `from_file` is given it must be configured as the one the file was
+        saved from, but needn't hold any signatures.
+    from_file : file_like
+        A file produced by `save_to_file`, opened for reading bytes.
+    """
+    def __init__(self, hashes, from_file=None):
+        self.hashes = hashes
+        self.n = hashes.n
         if from_file is not None:
             self.load_from_file(from_file)
         else:
-            self._sizes = None
-            if pfam_args is None:
-                pfam_args = []
-            self.pfam_args = pfam_args
-            self.pfam = pfam
+            self.accs = list(hashes.hashes)
+            self.signatures = mh.signature_matrix(
+                [hashes.hashes[acc] for acc in self.accs], self.n)
 
     @property
-    def sizes(self):
-        if self._sizes is None:
-            self._sizes = {}
-            for family, proteins in self.pfam.Families(*self.pfam_args):
-                self._sizes[family] = len(proteins)
-        return self._sizes
+    def key(self):
+        """See `Hashes.key`."""
+        return self.hashes.key
 
-    # This can't be an instance variable. Otherwise it binds to the instance
-    # somehow!
-    @property
-    def size_method(self):
-        return Family.proteins_covered
+    def __len__(self):
+        return len(self.accs)
 
-    def save_to_file(self, filename):
-        with open(filename, 'x') as size_file:
-            json.dump(self.sizes, size_file)
+    def _scores(self, family, metric):
+        if metric == METRIC_JACCARD:
+            query = mh.signature_array(family.signature(self.hashes))
+            return self.accs, mh.jaccard_rows(self.signatures, query, self.n)
+        elif metric == METRIC_CONTAINMENT:
+            query = mh.signature_array(family.full_hash(self.hashes))
+            return self.accs, mh.containment_rows(self.signatures, query)
+        raise ValueError("Unknown metric {}".format(metric))
 
-    def load_from_file(self, size_file):
-        self._sizes = json.load(size_file)
+    def save_to_file(self, filename, provenance=False):
+        """Save the signatures to a path, in NumPy's npz format.
+
+        There must not already be a file located at `filename`
 
+        Parameters
+        ----------
+        filename : str
+        provenance : bool
+            If set, the full signatures of `hashes`, including the hashed
+            objects, are also saved to `provenance_location(filename)`, in
+            the format of `codec.write_signatures`."""
+        with open(filename, 'xb') as save_file:
+            np.savez(save_file, accs=np.array(self.accs, dtype=str),
+                     signatures=self.signatures,
+                     config=np.array(json.dumps({"key": self.key})))
+        if provenance:
+            with open(self.provenance_location(filename), 'xb') as f:
+                codec.write_signatures(self.hashes.hashes, f, self.n,
+                                       hash_bits=self.hashes.hash_bits)
 
-class ResidueSizes(Sizes):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def load_from_file(self, hash_file):
+        """Load the signatures from a file written by `save_to_file`.
+
+        Parameters
+        ----------
+        hash_file : file_like
+
+        Raises
+        ------
+        ValueError
+            If the file was saved with differently configured `hashes`.
+        """
+        data = np.load(hash_file)
+        config = json.loads(str(data["config"]))
+        if tuple(config["key"]) != self.key:
+            raise ValueError("The signatures were saved with different hashes")
+        self.accs = data["accs"].tolist()
+        self.signatures = data["signatures"]
+
+    @staticmethod
+    def provenance_location(filename):
+        """Get the location of the provenance sidecar of a signature file."""
+        return filename + ".provenance"
+
+    @staticmethod
+    def provenance(filename, family):
+        """Look up the hashed objects in a family's signature.
+
+        Parameters
+        ----------
+        filename : str
+            The location of a signature file saved with `provenance` set.
+        family : str
+            A Pfam family accession.
+
+        Returns
+        -------
+        dict
+            The object hashed to give each hash in the family's signature.
+        """
+        with open(HashArrays.provenance_location(filename), 'rb') as f:
+            return dict(codec.SignatureReader(f)[family])
+
+
+class _ArrayHashes(_ArrayScores, Hashes):
+    """Pfam signatures which are fixed length arrays.
+
+    The signatures of all families are stored as one matrix, and a family is
+    scored against all of Pfam by counting equal elements in each row. The
+    size of each Pfam family is stored alongside its signature, so
+    containment is estimated from the Jaccard index and the sizes of the Pfam
+    family and of the query.
+
+    Subclasses implement `_family_signature`, `_query_size` and `key`.
+    """
+    def __init__(self, n, from_file=None, pfam=pfam_db, pfam_args=None,
+                 _hashes=None, _sizes=None, release=None, clans_args=None):
+        self._sizes = _sizes
+        self._matrix = None
+        super().__init__(n, from_file, pfam, pfam_args, _hashes, release,
+                         clans_args=clans_args)
 
     @property
-    def sizes(self):
-        if self._sizes is None:
+    def hashes(self):
+        """See `Hashes.hashes`.
+
+        For fixed length signatures, the signatures are arrays."""
+        if self._hashes is None:
+            self._hashes = {}
             self._sizes = {}
             for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
-                self._sizes[family] = sum(e - s + 1 for _, s, e in regions)
+                signature, size = self._family_signature(list(regions))
+                self._hashes[family] = signature
+                self._sizes[family] = size
+        return self._hashes
+
+    @property
+    def sizes(self):
+        """Get the size of each Pfam family.
+
+        Returns
+        -------
+        dict of str to int
+        """
+        if self._sizes is None:
+            self.hashes
         return self._sizes
 
     @property
-    def size_method(self):
-        return Family.residues_covered
+    def matrix(self):
+        """Get the signatures of all Pfam families as a matrix.
+
+        Returns
+        -------
+        accs : list of str
+            Pfam family accessions, in the order of the rows of `signatures`.
+        signatures : numpy.ndarray
+            One signature per row.
+        sizes : numpy.ndarray
+            The size of each family.
+        """
+        if self._matrix is None:
+            accs = list(self.hashes)
+            signatures = np.array([self.hashes[acc] for acc in accs])
+            sizes = np.array([self.sizes[acc] for acc in accs],
+                             dtype=np.float64)
+            self._matrix = (accs, signatures.reshape(len(accs), self.n),
+                            sizes)
+        return self._matrix
 
+    def signature(self, family):
+        """See `Hashes.signature`."""
+        return self.sketch(family).signature()
 
-def chunks_from_coordinates(start, end, w):
-    """Given start and end coordinates and window size, calculate chunks.
+    def full_hash(self, family):
+        return mh.set_hashes(self.elements(family.regions()))
+
+    def _jaccard(self, signatures, signature):
+        return np.mean(signatures == signature, axis=-1)
+
+    def _scores(self, family, metric):
+        accs, signatures, sizes = self.matrix
+        size = self._query_size(family)
+        if size == 0:
+            return accs, np.zeros(len(accs))
+        jaccards = self._jaccard(signatures, family.signature(self))
+        if metric == METRIC_JACCARD:
+            return accs, jaccards
+        elif metric == METRIC_CONTAINMENT:
+            # The intersection size follows from the Jaccard index and the
+            # sizes of both sets.
+            intersections = jaccards * (sizes + size) / (1 + jaccards)
+            return accs, np.minimum(intersections / np.maximum(sizes, 1), 1)
+        raise ValueError("Unknown metric {}".format(metric))
+
+    def _config(self):
+        return {"n": self.n, "release": self.release}
+
+    def _configure(self, config):
+        self.n = config["n"]
+        self.release = config["release"]
+
+    def save_to_file(self, filename):
+        """Save the signatures to a path, in NumPy's npz format.
+
+        There must not already be a file located at `filename`
+
+        Parameters
+        ----------
+        filename : str"""
+        accs, signatures, sizes = self.matrix
+        with open(filename, 'xb') as save_file:
+            np.savez(save_file, accs=np.array(accs, dtype=str),
+                     signatures=signatures, sizes=sizes,
+                     config=np.array(json.dumps(self._config())))
+
+    def load_from_file(self, hash_file):
+        """Load the signatures from a file written by `save_to_file`.
+
+        The signature length is that with which the file was written.
+
+        Parameters
+        ----------
+        hash_file : file_like"""
+        data = np.load(hash_file)
+        self._configure(json.loads(str(data["config"])))
+        accs = data["accs"].tolist()
+        self._hashes = dict(zip(accs, data["signatures"]))
+        self._sizes = dict(zip(accs, data["sizes"].tolist()))
+        self._matrix = None
+        self._index = None
+
+    def clan_hashes(self, clans=None):
+        """See `Hashes.clan_hashes`.
+
+        Fixed length signatures cannot be merged, so clan signatures are
+        computed from the regions of their member families."""
+        if clans is None:
+            clans = self.pfam.Clans(*self.clans_args)
+        clan_for_family = {f: c for c, fs in clans for f in fs}
+        clan_regions = defaultdict(list)
+        for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
+            if family in clan_for_family:
+                clan_regions[clan_for_family[family]].extend(regions)
+        clan_hashes = copy.copy(self)
+        clan_hashes._hashes, clan_hashes._sizes = {}, {}
+        clan_hashes._matrix = None
+        clan_hashes._index = None
+        for clan, regions in clan_regions.items():
+            signature, size = self._family_signature(regions)
+            clan_hashes._hashes[clan] = signature
+            clan_hashes._sizes[clan] = size
+        return clan_hashes
+
+
+class OnePermutationHashes(_ArrayHashes):
+    """Generate or load fixed length Pfam signatures from disk.
+
+    Signatures are made by one permutation hashing with densification (see
+    `minhash.OnePermutationSketch`), optionally keeping only `b` bits of each
+    element. Every signature is an array of `k` unsigned integers, so the
+    signatures of all families are stored as one matrix, and a family is
+    scored against all of Pfam by counting equal elements in each row.
+
+    The number of distinct proteins or chunks in each Pfam family is stored
+    alongside its signature, to estimate containment from the Jaccard index.
 
     Parameters
     ----------
-    start, end : int
-        The start and end coordinates.
-    w : int
-        The window size.
+    k : int
+        The signature length.
+    b : int, optional
+        The number of bits kept from each element of the signatures. If not
+        given, 32 bits are kept.
+    w : int, optional
+        The window size. If given, (protein accession, chunk) tuples are
+        hashed, as for `ResidueHashes`. Otherwise protein accessions are.
+    from_file : file_like
+        A file produced by `save_to_file` from which signatures should be
+        loaded.
+    pfam : module
+    pfam_args : list
+    release : str, optional
+    clans_args : list, optional
+        See `Hashes`.
     """
-    return(list(range(start // w, end // w + 1)))
+    def __init__(self, k=128, b=None, w=None, from_file=None, pfam=pfam_db,
+                 pfam_args=None, _hashes=None, _sizes=None, release=None,
+                 clans_args=None):
+        self.b = b
+        self.w = w
+        super().__init__(k, from_file, pfam, pfam_args, _hashes, _sizes,
+                         release, clans_args)
+
+    @property
+    def key(self):
+        """See `Hashes.key`."""
+        return ("oph", self.b, self.w, self.n, self.release)
+
+    def _family_signature(self, regions):
+        hashes = element_hashes64(regions, self.w)
+        return mh.one_permutation_signature(hashes, self.n, self.b), len(hashes)
+
+    def _query_size(self, family):
+        if self.w is None:
+            return len(family.proteins())
+        return _chunks_covered(family, self.w)
+
+    def _jaccard(self, signatures, signature):
+        return mh.one_permutation_jaccard(signatures, signature, self.b)
+
+    def sketch(self, family):
+        """See `Hashes.sketch`.
+
+        Returns
+        -------
+        minhash.OnePermutationSketch
+        """
+        sketch = mh.OnePermutationSketch(self.n, self.b)
+        regions = list(family.regions())
+        if regions:
+            sketch.update_hashes(element_hashes64(regions, self.w))
+        return sketch
+
+    def elements(self, regions):
+        """See `Hashes.elements`."""
+        if self.w is None:
+            return super().elements(regions)
+        return _chunk_iterator(regions, self.w)
+
+    def _config(self):
+        return dict(super()._config(), b=self.b, w=self.w)
+
+    def _configure(self, config):
+        super()._configure(config)
+        self.b = config["b"]
+        self.w = config["w"]
+
+
+class WeightedHashes(_ArrayHashes):
+    """Generate or load weighted MinHash Pfam signatures from disk.
+
+    Each protein is weighted by the number of its residues covered by the
+    family, and signatures are made by improved consistent weighted sampling
+    (see `minhash.WeightedSketch`). Two signatures agree at each position
+    with probability equal to the weighted Jaccard index of their families,
+    the sum over proteins of the smaller weight, divided by the sum of the
+    larger.
+
+    This approximates residue overlap without choosing a window size.
+
+    Parameters
+    ----------
+    n : int
+        The signature length.
+    from_file : file_like
+        A file produced by `save_to_file` from which signatures should be
+        loaded.
+    pfam : module
+    pfam_args : list
+    release : str, optional
+    clans_args : list, optional
+        See `Hashes`.
+    """
+    def __init__(self, n=128, from_file=None, pfam=pfam_db, pfam_args=None,
+                 _hashes=None, _sizes=None, release=None, clans_args=None):
+        super().__init__(n, from_file, pfam, pfam_args, _hashes, _sizes,
+                         release, clans_args)
+
+    @property
+    def key(self):
+        """See `Hashes.key`."""
+        return ("icws", None, self.n, self.release)
+
+    def _family_signature(self, regions):
+        accs, weights = protein_residues(regions)
+        sketch = mh.WeightedSketch(self.n)
+        sketch.update_weights(accs, weights)
+        return sketch.signature(), int(weights.sum())
+
+    def _query_size(self, family):
+        return family.residues_covered()
+
+    def sketch(self, family):
+        """See `Hashes.sketch`.
+
+        Returns
+        -------
+        ResidueWeightedSketch
+        """
+        sketch = ResidueWeightedSketch(self.n)
+        sketch.update(family.regions())
+        return sketch
+
+    def elements(self, regions):
+        """See `Hashes.elements`.
+
+        For `WeightedHashes`, the objects are the regions themselves, as
+        adding a region changes the weight of its protein."""
+        return iter(regions)
+
+
+class ResidueWeightedSketch(object):
+    """
+    A weighted MinHash sketch of proteins weighted by covered residues.
+
+    The sketch is updated with protein regions. Adding a region only
+    resamples its protein, as a protein's weight never decreases.
+
+    Parameters
+    ----------
+    n : int
+        Signature length.
+    """
+    def __init__(self, n):
+        self._sketch = mh.WeightedSketch(n)
+        self._regions = defaultdict(list)
+
+    def update(self, regions):
+        """
+        Add regions to the sketch.
+
+        Parameters
+        ----------
+        regions : iterable of (str, int, int)
+            Protein accessions, and the start and end coordinates of regions.
+        """
+        changed = set()
+        for acc, start, end in regions:
+            self._regions[acc].append((acc, start, end))
+            changed.add(acc)
+        if changed:
+            accs, weights = protein_residues(
+                r for acc in changed for r in self._regions[acc])
+            self._sketch.update_weights(accs, weights)
+
+    def signature(self):
+        """
+        Get the signature of the regions added so far.
+
+        Returns
+        -------
+        numpy.ndarray of uint64
+        """
+        return self._sketch.signature()
+
+
+class ContainmentIndex(_ArrayScores):
+    """Count the elements a query shares with each Pfam family.
+
+    Each Pfam family's proteins or chunks are stored in a Bloom filter, so a
+    query is compared with Pfam by looking up each of its own elements,
+    rather than by sampling the Pfam families. This suits small queries, for
+    which MinHash estimates of containment are poor, at the cost of storing
+    around `-log2(fp_rate) * 1.44` bits per element.
+
+    Filters of the same size are stored as rows of one bit matrix, so each
+    query element is hashed once per size, and looked up in every family of
+    that size at once. Counts are corrected for the expected number of false
+    positives.
+
+    The index has the same scoring methods as `Hashes`, so it can be used by
+    a `HashSifter`. As for `Hashes`, containment is the fraction of each
+    Pfam family's elements which are in the query.
+
+    Parameters
+    ----------
+    w : int, optional
+        The window size. If given, (protein accession, chunk) tuples are
+        indexed, as for `ResidueHashes`. Otherwise protein accessions are.
+    fp_rate : float
+        The false positive rate of each Bloom filter.
+    from_file : file_like
+        A file produced by `save_to_file` from which the index should be
+        loaded.
+    pfam : module
+    pfam_args : list
+        See `Hashes`.
+    """
+    # The number of filter bits looked up at once, bounding the memory used.
+    _block_size = 1 << 24
+
+    def __init__(self, w=None, fp_rate=0.01, from_file=None, pfam=pfam_db,
+                 pfam_args=None, _filters=None):
+        self.w = w
+        self.fp_rate = fp_rate
+        if pfam_args is None:
+            pfam_args = []
+        self.pfam_args = pfam_args
+        self.pfam = pfam
+        if from_file is not None:
+            self.load_from_file(from_file)
+        else:
+            self._filters = _filters
+
+    @property
+    def k(self):
+        """Get the number of bits set for each element."""
+        return max(1, int(round(-np.log2(self.fp_rate))))
+
+    @property
+    def filters(self):
+        """Get the Bloom filters, grouped by their size.
+
+        Returns
+        -------
+        dict
+            For each filter size in bits, a tuple of the Pfam family
+            accessions with filters of that size, the filters as rows of a
+            matrix of bytes, and the number of elements in each family.
+        """
+        if self._filters is None:
+            groups = defaultdict(lambda: ([], [], []))
+            for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
+                hashes = element_hashes64(regions, self.w)
+                m = self._filter_size(len(hashes))
+                accs, bits, sizes = groups[m]
+                accs.append(family)
+                bits.append(self._filter(hashes, m))
+                sizes.append(len(hashes))
+            self._filters = {m: (accs, np.array(bits), np.array(sizes))
+                             for m, (accs, bits, sizes) in groups.items()}
+        return self._filters
+
+    def _filter_size(self, n):
+        # The smallest power of two number of bits giving the false positive
+        # rate for n elements.
+        bits = max(64, -n * np.log(self.fp_rate) / np.log(2) ** 2)
+        return 1 << int(np.ceil(np.log2(bits)))
+
+    def _positions(self, hashes, m):
+        # The bits set for each element, from independent rehashes of its
+        # hash. Double hashing gives correlated positions when m is a power
+        # of two.
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        seeds = mh._mix64(np.arange(self.k, dtype=np.uint64))
+        return mh._mix64(hashes[:, None] ^ seeds[None, :]) & np.uint64(m - 1)
+
+    def _filter(self, hashes, m):
+        bits = np.zeros(m // 8, dtype=np.uint8)
+        positions = np.unique(self._positions(hashes, m))
+        np.bitwise_or.at(bits, (positions >> np.uint64(3)).astype(np.intp),
+                         np.left_shift(1, positions & np.uint64(7))
+                         .astype(np.uint8))
+        return bits
+
+    def intersections(self, family):
+        """Estimate the number of elements a family shares with each Pfam
+        family.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+
+        Returns
+        -------
+        accs : list of str
+            Pfam family accessions.
+        intersections : numpy.ndarray of float
+            The estimated number of shared elements for each family.
+        sizes : numpy.ndarray of int
+            The number of elements in each Pfam family.
+        size : int
+            The number of elements in `family`.
+        """
+        regions = list(family.regions())
+        hashes = (element_hashes64(regions, self.w) if regions
+                  else np.zeros(0, dtype=np.uint64))
+        all_accs, all_counts, all_sizes = [], [], []
+        for m, (accs, bits, sizes) in self.filters.items():
+            positions = self._positions(hashes, m)
+            counts = np.zeros(len(accs))
+            step = max(1, self._block_size // max(1, len(accs) * self.k))
+            for start in range(0, len(hashes), step):
+                block = positions[start:start + step]
+                found = bits[:, (block >> np.uint64(3)).astype(np.intp)]
+                masks = np.left_shift(1, block & np.uint64(7)).astype(np.uint8)
+                counts += np.all(found & masks, axis=2).sum(axis=1)
+            # Remove the false positives expected among the elements which
+            # aren't in each family.
+            fp = (1 - np.exp(-self.k * sizes / m)) ** self.k
+            counts = (counts - len(hashes) * fp) / (1 - fp)
+            all_accs.extend(accs)
+            all_counts.append(np.clip(counts, 0,
+                                      np.minimum(sizes, len(hashes))))
+            all_sizes.append(sizes)
+        if not all_accs:
+            return [], np.zeros(0), np.zeros(0, dtype=np.int64), len(hashes)
+        return (all_accs, np.concatenate(all_counts),
+                np.concatenate(all_sizes), len(hashes))
+
+    def _scores(self, family, metric):
+        accs, intersections, sizes, size = self.intersections(family)
+        if metric == METRIC_JACCARD:
+            unions = np.maximum(sizes + size - intersections, 1)
+            return accs, intersections / unions
+        elif metric == METRIC_CONTAINMENT:
+            return accs, intersections / np.maximum(sizes, 1)
+        raise ValueError("Unknown metric {}".format(metric))
+
+    def query_containment(self, family):
+        """Estimate the fraction of a family contained in each Pfam family.
+
+        Parameters
+        ----------
+        family : searchsifter.Family
+
+        Returns
+        -------
+        dict
+            A dictionary with `str` Pfam family accession keys and `float`
+            values.
+        """
+        accs, intersections, _, size = self.intersections(family)
+        return dict(zip(accs, (intersections / max(size, 1)).tolist()))
+
+    def save_to_file(self, filename):
+        """Save the index to a path, in NumPy's npz format.
+
+        There must not already be a file located at `filename`
+
+        Parameters
+        ----------
+        filename : str"""
+        arrays = {}
+        for m, (accs, bits, sizes) in self.filters.items():
+            arrays["accs_{}".format(m)] = np.array(accs, dtype=str)
+            arrays["bits_{}".format(m)] = bits
+            arrays["sizes_{}".format(m)] = sizes
+        config = {"w": self.w, "fp_rate": self.fp_rate,
+                  "sizes": list(self.filters)}
+        with open(filename, 'xb') as save_file:
+            np.savez(save_file, config=np.array(json.dumps(config)), **arrays)
+
+    def load_from_file(self, index_file):
+        """Load the index from a file written by `save_to_file`.
+
+        Parameters
+        ----------
+        index_file : file_like"""
+        data = np.load(index_file)
+        config = json.loads(str(data["config"]))
+        self.w = config["w"]
+        self.fp_rate = config["fp_rate"]
+        self._filters = {m: (data["accs_{}".format(m)].tolist(),
+                             data["bits_{}".format(m)],
+                             data["sizes_{}".format(m)])
+                         for m in config["sizes"]}
+
+
+class ClanMembership(object):
+    """Map Pfam clans to their member families, and families to their clans.
+
+    The membership is loaded once, either from disk or using `pfam`, and is
+    read-only thereafter. Use `shared` to get a single instance per source of
+    Pfam data, so that the membership is loaded at most once per process.
+
+    Parameters
+    ----------
+    from_file : file_like
+        A JSON encoded file produced by `save_to_file` from which the
+        membership should be loaded.
+    pfam : module
+        The module which should be used for loading Pfam data, i.e., pfam_db
+        or pfam_file.
+    clans_args : list, optional
+        The args which should be supplied to the `Clans` constructor of the
+        module providing Pfam data. If using the MySQL database, this should
+        be empty, if using flat files it should contain the filename of the
+        Pfam clans file, and optionally its file type.
+    """
+    _instances = {}
+
+    def __init__(self, from_file=None, pfam=pfam_db, clans_args=None,
+                 _clans=None):
+        if clans_args is None:
+            clans_args = []
+        self.clans_args = clans_args
+        self.pfam = pfam
+        self._clans = None
+        self._families = None
+        if from_file is not None:
+            self.load_from_file(from_file)
+        elif _clans is not None:
+            self._index(_clans)
+
+    @classmethod
+    def shared(cls, pfam=pfam_db, clans_args=None):
+        """Get the process-wide instance for a source of Pfam data.
+
+        Parameters
+        ----------
+        pfam : module
+        clans_args : list
+
+        Returns
+        -------
+        ClanMembership
+        """
+        key = (pfam, tuple(clans_args or []))
+        try:
+            return cls._instances[key]
+        except KeyError:
+            new_instance = cls(pfam=pfam, clans_args=clans_args)
+            new_instance.clans
+            cls._instances[key] = new_instance
+            return new_instance
+
+    def __iter__(self):
+        """Iterate over Pfam clans and their members.
+
+        Yields
+        ------
+        str
+            The clan's Pfam accession.
+        frozenset of str
+            The accessions of the Pfam families in the clan.
+        """
+        return iter(self.clans.items())
+
+    @property
+    def clans(self):
+        """Get the read-only mapping of clan accessions to their members.
+
+        Returns
+        -------
+        mapping
+            key-value pairs described in `__iter__`.
+        """
+        if self._clans is None:
+            self._index(self.pfam.Clans(*self.clans_args))
+        return self._clans
+
+    def _index(self, clans):
+        self._clans = MappingProxyType({c: frozenset(fs) for c, fs in clans})
+        self._families = MappingProxyType({f: c for c, fs
+                                           in self._clans.items()
+                                           for f in fs})
+
+    def families_in_clan(self, clan):
+        """Get the members of a clan.
+
+        Parameters
+        ----------
+        clan : str
+
+        Returns
+        -------
+        frozenset of str
+        """
+        return self.clans[clan]
+
+    def clan_for_family(self, family):
+        """Get the clan of which a family is a member, if any.
+
+        Parameters
+        ----------
+        family : str
+
+        Returns
+        -------
+        str or None
+            If the family is a member of a clan, returns the clan's accession,
+            otherwise None.
+        """
+        self.clans
+        return self._families.get(family)
+
+    def save_to_file(self, filename):
+        """Save the membership to a path.
+
+        There must not already be a file located at `filename`
+
+        Parameters
+        ----------
+        filename : str"""
+        with open(filename, 'x') as save_file:
+            json.dump({c: sorted(fs) for c, fs in self}, save_file)
+
+    def load_from_file(self, clan_file):
+        """Load the membership from a file.
+
+        Parameters
+        ----------
+        clan_file : file_like"""
+        self._index(json.load(clan_file).items())
+
+
+class Sizes(object):
+    def __init__(self, from_file=None, pfam=pfam_db, pfam_args=None,
+                 _sizes=None, clans_args=None):
+        if pfam_args is None:
+            pfam_args = []
+        self.pfam_args = pfam_args
+        if clans_args is None:
+            clans_args = []
+        self.clans_args = clans_args
+        self.pfam = pfam
+        if from_file is not None:
+            self.load_from_file(from_file)
+        else:
+            self._sizes = _sizes
+
+    @property
+    def sizes(self):
+        if self._sizes is None:
+            self._sizes = {}
+            for family, proteins in self.pfam.Families(*self.pfam_args):
+                self._sizes[family] = len(proteins)
+        return self._sizes
+
+    # This can't be an instance variable. Otherwise it binds to the instance
+    # somehow!
+    @property
+    def size_method(self):
+        return Family.proteins_covered
+
+    def clan_sizes(self, clans=None):
+        """Get a `Sizes` object containing the sizes of clans.
+
+        The size of a clan is the size of the union of its member families,
+        measured using `size_method`.
+
+        Parameters
+        ----------
+        clans : iterable of (str, set of str), optional
+            Clan accessions and the accessions of their member families. If
+            not given, clans are loaded using `pfam`.
+
+        Returns
+        -------
+        Sizes
+        """
+        return type(self)(_sizes=self._clan_sizes(clans))
+
+    def _clan_sizes(self, clans=None):
+        if clans is None:
+            clans = self.pfam.Clans(*self.clans_args)
+        clan_for_family = {f: c for c, fs in clans for f in fs}
+        clan_families = defaultdict(Family)
+        for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
+            try:
+                clan = clan_families[clan_for_family[family]]
+            except KeyError:
+                continue
+            for acc, start, end in regions:
+                clan.add_region(acc, start, end)
+        return {c: self.size_method(f) for c, f in clan_families.items()}
+
+    def save_to_file(self, filename):
+        with open(filename, 'x') as size_file:
+            json.dump(self.sizes, size_file)
+
+    def load_from_file(self, size_file):
+        self._sizes = json.load(size_file)
+
+
+class ResidueSizes(Sizes):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    @property
+    def sizes(self):
+        if self._sizes is None:
+            self._sizes = {}
+            for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
+                self._sizes[family] = sum(e - s + 1 for _, s, e in regions)
+        return self._sizes
+
+    @property
+    def size_method(self):
+        return Family.residues_covered
+
+
+class SketchSizes(Sizes):
+    """
+    Estimate the sizes of families and clans with HyperLogLog sketches.
+
+    Each family is summarised by a sketch of its proteins or chunks, so the
+    sizes of clans and other unions of families are estimated by merging
+    sketches, rather than from region sets. The size of a query family is
+    counted exactly.
+
+    Parameters
+    ----------
+    w : int, optional
+        The window size. If given, sizes are numbers of chunks. Otherwise
+        they are numbers of proteins.
+    p : int
+        The precision of the sketches. See `HyperLogLog`.
+    from_file : file, optional
+        A file written by `save_to_file`.
+    pfam : module
+        The source of Pfam families.
+    pfam_args : list, optional
+        Arguments passed to `pfam.FamiliesRegions`.
+    clans_args : list, optional
+        Arguments passed to `pfam.Clans`. See `Hashes`.
+    """
+    def __init__(self, w=None, p=12, from_file=None, pfam=pfam_db,
+                 pfam_args=None, _sketches=None, clans_args=None):
+        self.w = w
+        self.p = p
+        self._sketches = _sketches
+        super().__init__(from_file, pfam, pfam_args, clans_args=clans_args)
+
+    @property
+    def sketches(self):
+        """
+        Get the sketch of each family.
+
+        Returns
+        -------
+        dict of str to HyperLogLog
+        """
+        if self._sketches is None:
+            self._sketches = {}
+            for family, regions in self.pfam.FamiliesRegions(*self.pfam_args):
+                sketch = HyperLogLog(self.p)
+                sketch.update_hashes(element_hashes64(regions, self.w))
+                self._sketches[family] = sketch
+        return self._sketches
+
+    @property
+    def sizes(self):
+        if self._sizes is None:
+            self._sizes = {f: len(s) for f, s in self.sketches.items()}
+        return self._sizes
+
+    @property
+    def size_method(self):
+        if self.w is None:
+            return Family.proteins_covered
+        return partial(_chunks_covered, w=self.w)
+
+    def union_size(self, families):
+        """
+        Estimate the size of the union of some families.
+
+        Parameters
+        ----------
+        families : iterable of str
+            Family accessions.
+
+        Returns
+        -------
+        int
+        """
+        sketches = [self.sketches[f] for f in families]
+        if not sketches:
+            return 0
+        return len(sketches[0].union(*sketches[1:]))
+
+    def intersection_size(self, a, b):
+        """
+        Estimate the size of the intersection of two families.
+
+        Parameters
+        ----------
+        a, b : str
+            Family accessions.
+
+        Returns
+        -------
+        int
+        """
+        return int(round(
+            self.sketches[a].intersection_cardinality(self.sketches[b])))
+
+    def clan_sizes(self, clans=None):
+        """Get a `SketchSizes` object containing the sizes of clans.
+
+        The sketch of a clan is the union of the sketches of its member
+        families.
+
+        Parameters
+        ----------
+        clans : iterable of (str, set of str), optional
+            Clan accessions and the accessions of their member families. If
+            not given, clans are loaded using `pfam`.
+
+        Returns
+        -------
+        SketchSizes
+        """
+        if clans is None:
+            clans = self.pfam.Clans(*self.clans_args)
+        sketches = {}
+        for clan, families in clans:
+            members = [self.sketches[f] for f in families
+                       if f in self.sketches]
+            if members:
+                sketches[clan] = members[0].union(*members[1:])
+        return type(self)(self.w, self.p, _sketches=sketches)
+
+    def _clan_sizes(self, clans=None):
+        return self.clan_sizes(clans).sizes
+
+    def save_to_file(self, filename):
+        with open(filename, 'x') as size_file:
+            json.dump({"p": self.p, "w": self.w,
+                       "sketches": {f: s.to_string()
+                                    for f, s in self.sketches.items()}},
+                      size_file)
+
+    def load_from_file(self, size_file):
+        data = json.load(size_file)
+        self.p = data["p"]
+        self.w = data["w"]
+        self._sketches = {f: HyperLogLog.from_string(s, self.p)
+                          for f, s in data["sketches"].items()}
+        self._sizes = None
+
+
+def element_hashes64(regions, w=None):
+    """Compute 64 bit hashes of the proteins or chunks covered by regions.
+
+    Parameters
+    ----------
+    regions : iterable of (str, int, int)
+        Protein accessions, and the start and end coordinates of regions.
+    w : int, optional
+        The window size. If not given, proteins are hashed.
+
+    Returns
+    -------
+    numpy.ndarray of uint64
+        The hashes of the distinct proteins or (protein accession, chunk)
+        tuples, as computed by `minhash.hash64`.
+    """
+    accs, protein_ids, starts, ends = region_arrays(regions)
+    if w is None:
+        return np.array([mh.hash64(acc) for acc in accs], dtype=np.uint64)
+    return _hash_chunk_array(accs, chunk_array(protein_ids, starts, ends, w),
+                             64)
+
+
+def protein_residues(regions):
+    """Count the residues of each protein covered by regions.
+
+    Overlapping and adjacent regions of a protein are merged, as for
+    `Family.residues_covered`.
+
+    Parameters
+    ----------
+    regions : iterable of (str, int, int)
+        Protein accessions, and the start and end coordinates of regions.
+
+    Returns
+    -------
+    accs : list of str
+        The distinct protein accessions, sorted.
+    residues : numpy.ndarray of int
+        The number of residues covered on each protein.
+    """
+    accs, protein_ids, starts, ends = region_arrays(regions)
+    if len(accs) == 0:
+        return accs, np.zeros(0, dtype=np.int64)
+    order = np.lexsort((starts, protein_ids))
+    protein_ids, starts, ends = protein_ids[order], starts[order], ends[order]
+    # A region begins a new run of merged regions unless it starts at or
+    # before the residue after the furthest end so far on the same protein.
+    # Offsetting the ends by protein keeps the running maximum per protein.
+    offset = np.int64(ends.max() + 2)
+    furthest = np.maximum.accumulate(protein_ids * offset + ends)
+    new_run = np.ones(len(starts), dtype=bool)
+    new_run[1:] = ((protein_ids[1:] != protein_ids[:-1]) |
+                   (protein_ids[1:] * offset + starts[1:] > furthest[:-1] + 1))
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = (np.maximum.reduceat(ends, run_starts) -
+                   starts[run_starts] + 1)
+    residues = np.bincount(protein_ids[run_starts], weights=run_lengths,
+                           minlength=len(accs))
+    return accs, residues.astype(np.int64)
+
+
+def _chunks_covered(family, w):
+    # The number of distinct chunks covered by a family.
+    regions = list(family.regions())
+    if not regions:
+        return 0
+    return len(chunk_array(*region_arrays(regions)[1:], w))
+
+
+def chunks_from_coordinates(start, end, w):
+    """Given start and end coordinates and window size, calculate chunks.
+
+    Parameters
+    ----------
+    start, end : int
+        The start and end coordinates.
+    w : int
+        The window size.
+    """
+    return(list(range(start // w, end // w + 1)))
 
 
 def _decode(s):
@@ -327,6 +1829,116 @@ def _decode(s):
         return s
 
 
+def region_arrays(regions):
+    """Convert protein regions to arrays.
+
+    Parameters
+    ----------
+    regions : iterable of (str, int, int)
+        Protein accessions, and the start and end coordinates of regions.
+
+    Returns
+    -------
+    accs : list of str
+        The distinct protein accessions, sorted.
+    protein_ids, starts, ends : numpy.ndarray
+        For each region, the index of its protein in `accs`, and its start
+        and end coordinates.
+    """
+    regions = list(regions)
+    accs, protein_ids = np.unique(np.array([r[0] for r in regions], dtype=str),
+                                  return_inverse=True)
+    starts = np.array([r[1] for r in regions], dtype=np.int64)
+    ends = np.array([r[2] for r in regions], dtype=np.int64)
+    return accs.tolist(), protein_ids.reshape(-1), starts, ends
+
+
+def chunk_array(protein_ids, starts, ends, w):
+    """Enumerate the distinct chunks covered by regions.
+
+    This gives the same chunks as `chunks_from_coordinates` for each region,
+    without building a list for every region.
+
+    Parameters
+    ----------
+    protein_ids, starts, ends : numpy.ndarray
+        For each region, an integer identifying its protein, which must be
+        less than 2 ** 32, and its start and end coordinates.
+    w : int
+        The window size.
+
+    Returns
+    -------
+    numpy.ndarray of uint64
+        The distinct (protein ID, chunk) pairs, sorted, and packed with the
+        protein ID in the high 32 bits and the chunk in the low 32 bits.
+    """
+    first = np.asarray(starts, dtype=np.int64) // w
+    last = np.asarray(ends, dtype=np.int64) // w
+    counts = last - first + 1
+    # Expand each region into its run of chunks: the offset of each chunk
+    # within its region is its position in the output, less the position at
+    # which its region's run begins.
+    run_starts = np.cumsum(counts) - counts
+    offsets = np.arange(counts.sum()) - np.repeat(run_starts, counts)
+    chunks = (np.repeat(first, counts) + offsets).astype(np.uint64)
+    ids = np.repeat(np.asarray(protein_ids, dtype=np.uint64), counts)
+    return np.unique((ids << np.uint64(32)) | chunks)
+
+
+def _unpack_chunks(accs, chunks):
+    # Convert packed chunks back to (protein accession, chunk) tuples.
+    return list(zip([accs[i] for i in (chunks >> np.uint64(32)).tolist()],
+                    (chunks & np.uint64(0xffffffff)).tolist()))
+
+
+def _hash_chunk_array(accs, chunks, hash_bits=32):
+    # Hash sorted packed chunks as (protein accession, chunk) tuples. The
+    # chunks of each protein are contiguous, so are hashed together.
+    hashes = np.empty(len(chunks),
+                      dtype=np.uint32 if hash_bits == 32 else np.uint64)
+    ids = chunks >> np.uint64(32)
+    numbers = chunks & np.uint64(0xffffffff)
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1,
+                             [len(chunks)]]).tolist()
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if start < stop:
+            acc = accs[int(ids[start])]
+            if hash_bits == 32:
+                hashes[start:stop] = mh.crc32_pair_hashes(
+                    acc, numbers[start:stop].tolist())
+            else:
+                hashes[start:stop] = mh.hash64_pairs(acc, numbers[start:stop])
+    return hashes
+
+
+def _bottom_signature(accs, chunks, hashes, n):
+    # Select the signature of length n from hashed packed chunks. Tuples are
+    # only built for chunks whose hash may be in the signature.
+    if len(hashes) > n:
+        threshold = np.partition(hashes, n - 1)[n - 1]
+        selected = np.flatnonzero(hashes <= threshold)
+        chunks, hashes = chunks[selected], hashes[selected]
+    candidates = zip(hashes.tolist(), _unpack_chunks(accs, chunks))
+    return set(sorted(candidates)[:n])
+
+
+def _window_signatures(regions, ws, n, hash_bits=32):
+    # Compute the signatures of the chunks covered by some regions, for
+    # several window sizes. Each distinct chunk is hashed once, as it is the
+    # same object in every window.
+    accs, protein_ids, starts, ends = region_arrays(regions)
+    window_chunks = {w: chunk_array(protein_ids, starts, ends, w) for w in ws}
+    all_chunks = np.unique(np.concatenate(
+        [np.empty(0, dtype=np.uint64)] + list(window_chunks.values())))
+    all_hashes = _hash_chunk_array(accs, all_chunks, hash_bits)
+    signatures = {}
+    for w, chunks in window_chunks.items():
+        hashes = all_hashes[np.searchsorted(all_chunks, chunks)]
+        signatures[w] = _bottom_signature(accs, chunks, hashes, n)
+    return signatures
+
+
 def _chunk_iterator(regions, w):
     for acc, start, end in regions:
         for chunk in chunks_from_coordinates(start, end, w):
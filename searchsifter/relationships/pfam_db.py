@@ -3,7 +3,10 @@ from pkg_resources import Requirement, resource_filename
 import json
 import pymysql as mc
 import os
-from ..Family import Family
+import sqlite3
+from ..Family import Family, _merge_ranges
+
+SQLITE_CONFIG_KEY = "sqlite"
 
 
 def load_config(file_=None):
@@ -18,6 +21,9 @@ def load_config(file_=None):
         A file like object containing a JSON dictionary which will be unpacked
         and passed directly to MySQL as the connection parameters. If not
         given, SEARCH_SIFTER_DB_CONFIG is used to find the configuration.
+        If the dictionary has the key `SQLITE_CONFIG_KEY`, its value is
+        instead the path to an SQLite database with the same tables, such as
+        one written by `synthetic.write_sqlite`.
     """
     if file_ is None:
         try:
@@ -37,13 +43,43 @@ class Cnx(object):
     def __enter__(self, config=None):
         if config is None:
             config = load_config()
-        self.cnx = mc.connect(**config)
+        if SQLITE_CONFIG_KEY in config:
+            self.cnx = _SQLiteConnection(config[SQLITE_CONFIG_KEY])
+        else:
+            self.cnx = mc.connect(**config)
         return self.cnx
 
     def __exit__(self, type, valu7e, traceback):
         self.cnx.close()
 
 
+class _SQLiteConnection(object):
+    # Wrap an SQLite connection so that it accepts the queries in this
+    # module, which use MySQL's %s placeholders.
+    def __init__(self, filename):
+        self._cnx = sqlite3.connect(filename)
+
+    def cursor(self):
+        return _SQLiteCursor(self._cnx.cursor())
+
+    def close(self):
+        self._cnx.close()
+
+
+class _SQLiteCursor(object):
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=()):
+        return self._cursor.execute(query.replace("%s", "?"), args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
 _families_query = ("select distinct pfamA_acc, pfamseq_acc "
                    "from pfamA_reg_full_significant "
                    "order by pfamA_acc; ")
@@ -56,6 +92,11 @@ _family_query = ("select pfamseq_acc, ali_start, ali_end "
                  "from pfamA_reg_full_significant "
                  "where pfamA_acc=%s; ")
 
+_clan_regions_query = ("select r.pfamseq_acc, r.ali_start, r.ali_end "
+                       "from pfamA_reg_full_significant r "
+                       "join clan_membership c on r.pfamA_acc=c.pfamA_acc "
+                       "where c.clan_acc=%s; ")
+
 _clans_query = ("select clan_acc, pfamA_acc "
                 "from clan_membership "
                 "order by clan_acc; ")
@@ -283,11 +324,22 @@ class PfamFamily(Family):
 
 
 class PfamClan(Family):
+    """Fetch a single Pfam clan from the MySQL database.
+
+    The clan is characterised by its accession and by the union of the
+    regions of its member families. These are fetched with a single query,
+    rather than by loading each member as a `PfamFamily`.
+
+    For each accession, there should be at most one instance of this class.
+    """
     _instances = {}
 
-    def __init__(self, accession):
+    def __init__(self, accession, _query=_clan_regions_query):
+        """.. warning:: This class should be instantiated using
+        `from_accession`"""
         super().__init__()
         self.accession = accession
+        self._query = _query
 
     @classmethod
     def from_accession(cls, acc):
@@ -301,13 +353,23 @@ class PfamClan(Family):
             return new_instance
 
     def _load(self):
-        member_accs = Clans().families_in_clan(self.accession)
-        members = [PfamFamily.from_accession(a) for a in member_accs]
-        if len(members) > 1:
-            clan_regions = members[0].union(*members[1:])
-            self._regions = Family(_regions={k: [(v.start, v.stop) for v in vs]
-                                             for k, vs
-                                             in clan_regions.items()})._regions
+        with Cnx() as cnx:
+            cursor = cnx.cursor()
+            try:
+                cursor.execute(self._query, (self.accession,))
+                for row in cursor:
+                    proteinb, start, end = row
+                    protein = _decode(proteinb)
+                    self.add_region(protein, start, end)
+            except:
+                raise
+            finally:
+                cursor.close()
+        # Regions of different member families may overlap, so merge them to
+        # leave the union.
+        for protein, regions in self._regions.items():
+            merged = _merge_ranges(range(s, e + 1) for s, e in regions)
+            self._regions[protein] = [(r.start, r.stop - 1) for r in merged]
 
 
 def _decode(s):
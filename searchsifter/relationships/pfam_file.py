@@ -1,11 +1,15 @@
 """Load Pfam data from a flat file."""
 import gzip
 from ..Family import Family
+from collections import defaultdict
 import sys
 
 PFAM_FILETYPE_STOCKHOLM = "stockholm"
 PFAM_FILETYPE_REGIONS = "regions"
 
+PFAM_CLANS_FILETYPE_STOCKHOLM = "stockholm"
+PFAM_CLANS_FILETYPE_TSV = "tsv"
+
 
 class FamiliesRegions(object):
     """Iterate over Pfam families and their members.
@@ -37,8 +41,8 @@ class Families(object):
     For each Pfam family, yield the family accession and the accessions
     of all proteins with a matching region for the family.
     """
-    def __init__(self, filename):
-        self.families_regions = FamiliesRegions(filename=filename)
+    def __init__(self, filename, filetype=PFAM_FILETYPE_REGIONS):
+        self.families_regions = FamiliesRegions(filename, filetype)
 
     def __iter__(self):
         """
@@ -100,6 +104,109 @@ class PfamFamilies(object):
             return empty_fam
 
 
+class Clans(object):
+    """Find the members of a clan, from a Pfam clans flat file.
+
+    The file is parsed once, on construction, and the clan-family
+    associations are held in dictionaries for future queries.
+
+    Parameters
+    ----------
+    filename : str
+        Path to a gzipped Pfam clans file, either `Pfam-A.clans.tsv.gz` or
+        `Pfam-C.gz`.
+    filetype : tsv (default) or stockholm
+    """
+    def __init__(self, filename, filetype=PFAM_CLANS_FILETYPE_TSV):
+        self.filename = filename
+        self.filetype = filetype
+        self.clans = None
+        self.reversed_clans = None
+        self._load()
+
+    def _load(self):
+        self.clans = dict(pfam_clans_file_iter(self.filename, self.filetype))
+        self.reversed_clans = {f: c for c, fs in self.clans.items() for f in fs}
+
+    def __iter__(self):
+        """Iterate over Pfam clans and their members.
+
+        For each clan, yields the set of Pfam family accessions which comprise
+        it.
+
+        Yields
+        ------
+        str
+            The clans's Pfam accesion.
+        set of str
+            The accessions of the Pfam families in the clan.
+        """
+        return iter(self.clans.items())
+
+    def families_in_clan(self, clan):
+        """Get the members of a clan.
+
+        Parameters
+        ----------
+        clan : str
+
+        Returns
+        -------
+        set of str
+        """
+        return self.clans[clan]
+
+    def clan_for_family(self, family):
+        """Get the clan of which a family is a member, if any.
+
+        Parameters
+        ----------
+        family : str
+
+        Returns
+        -------
+        str or None
+            If the family is a member of a clan, returns the clan's accession,
+            otherwise None.
+        """
+        try:
+            return self.reversed_clans[family]
+        except KeyError:
+            return None
+
+
+def pfam_clans_file_iter(filename, filetype):
+    if filetype == PFAM_CLANS_FILETYPE_TSV:
+        # Rows are keyed by family, and families which are not in a clan
+        # have an empty clan column.
+        clans = defaultdict(set)
+        with gzip.open(filename, 'rt', encoding="latin_1") as clans_file:
+            for line in clans_file:
+                components = line.rstrip('\n').split('\t')
+                if len(components) > 1 and components[1]:
+                    clans[components[1]].add(components[0])
+        yield from sorted(clans.items())
+    elif filetype == PFAM_CLANS_FILETYPE_STOCKHOLM:
+        current_clan = None
+        current_members = set()
+        with gzip.open(filename, 'rt', encoding="latin_1") as clans_file:
+            for line in clans_file:
+                components = line.split()
+                if len(components) == 0:
+                    continue
+                elif components[0] == "#=GF":
+                    if components[1] == "AC":
+                        current_clan = components[2].split('.')[0]
+                    elif components[1] == "MB":
+                        current_members.add(components[2].rstrip(';'))
+                elif components[0] == "//":
+                    yield current_clan, current_members
+                    current_clan = None
+                    current_members = set()
+    else:
+        raise RuntimeError
+
+
 def pfam_file_iter(filename, filetype):
     if filetype == PFAM_FILETYPE_REGIONS:
         current_fam = None
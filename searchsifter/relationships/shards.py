@@ -0,0 +1,194 @@
+"""Store Pfam MinHash signatures in shards, and score against them in parallel.
+"""
+import binascii
+import json
+import multiprocessing
+import os
+import uuid
+import numpy as np
+from searchsifter.relationships import minhash as mh
+from .pfam import METRIC_JACCARD, METRIC_CONTAINMENT, _ArrayScores
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def save_shards(hashes, directory, shards):
+    """Partition the signatures of a `Hashes` object into shard files.
+
+    Each Pfam family is assigned to a shard by a hash of its accession. The
+    signatures in each shard are saved as a matrix of sorted hashes in
+    NumPy's npy format, which can be memory mapped, and a manifest lists the
+    shards and the families in each.
+
+    Only the hashes of the signatures are saved, so distinct elements
+    sharing a hash can't be told apart. `hashes` must therefore hold 64 bit
+    hashes, for which this is vanishingly unlikely.
+
+    Parameters
+    ----------
+    hashes : Hashes
+        The signatures to save.
+    directory : str
+        The directory in which to save the shards. It is created if it does
+        not exist, and must not already contain a manifest.
+    shards : int
+        The number of shards.
+
+    Raises
+    ------
+    ValueError
+        If `hashes` does not hold 64 bit hashes.
+    """
+    _check_hash_bits(hashes)
+    os.makedirs(directory, exist_ok=True)
+    accs = [[] for _ in range(shards)]
+    for acc in hashes.hashes:
+        accs[binascii.crc32(acc.encode()) % shards].append(acc)
+    manifest = {"n": hashes.n, "key": list(hashes.key), "shards": []}
+    for i, shard_accs in enumerate(accs):
+        filename = "shard_{}.npy".format(i)
+        matrix = mh.signature_matrix([hashes.hashes[a] for a in shard_accs],
+                                     hashes.n)
+        with open(os.path.join(directory, filename), 'xb') as shard_file:
+            np.save(shard_file, matrix)
+        manifest["shards"].append({"filename": filename, "accs": shard_accs})
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'x') as f:
+        json.dump(manifest, f)
+
+
+def _check_hash_bits(hashes):
+    if hashes.hash_bits != 64:
+        raise ValueError("Shards hold 64 bit hashes, not {} bit".format(
+            hashes.hash_bits))
+
+
+class ShardedHashes(_ArrayScores):
+    """Score families against Pfam signatures stored in shards.
+
+    Shards written by `save_shards` are memory mapped, so only the pages
+    which are read are held in memory. Queries are sent to every shard, in a
+    pool of worker processes, and the scores from each are merged. The
+    scoring methods are those of `Hashes`. Scores are computed from hashes
+    only, so differ from those of `Hashes` if distinct elements share a
+    hash; the shards must hold 64 bit hashes, for which this is vanishingly
+    unlikely.
+
+    The shards may be scored by any executor with a `map` method, such as a
+    `concurrent.futures` executor whose workers run on other machines, as
+    long as they can read `directory`.
+
+    Parameters
+    ----------
+    directory : str
+        The directory containing the shards.
+    hashes : Hashes
+        A `Hashes` object configured as the one the shards were saved from,
+        used to compute signatures of queries. It needn't hold any Pfam
+        signatures.
+    processes : int, optional
+        The number of worker processes. If 0, shards are scored in this
+        process. By default, there is one process per CPU. The pool is
+        started when a family is first scored, and stopped by `close`.
+        Shards are scored in this process when it is itself a daemonic
+        worker, such as those of `sift_parallel`, which cannot have
+        children.
+    executor : object, optional
+        An object whose `map(function, iterable)` method scores shards, used
+        instead of a pool of processes.
+
+    Raises
+    ------
+    ValueError
+        If `hashes` does not compute 64 bit hashes, or is configured
+        differently to the hashes the shards were saved from.
+    """
+    def __init__(self, directory, hashes, processes=None, executor=None):
+        _check_hash_bits(hashes)
+        self.directory = directory
+        self.hashes = hashes
+        with open(os.path.join(directory, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        if tuple(manifest["key"]) != hashes.key:
+            raise ValueError("The shards were saved with different hashes")
+        self.n = manifest["n"]
+        self.shards = [(os.path.join(directory, s["filename"]), s["accs"])
+                       for s in manifest["shards"]]
+        self.processes = processes
+        self.executor = executor
+        self._pool = None
+        self._token = uuid.uuid4().hex
+
+    @property
+    def key(self):
+        """See `Hashes.key`."""
+        return self.hashes.key
+
+    def close(self):
+        """Stop the worker processes, if any, and unmap the shards."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for filename, _ in self.shards:
+            _open_shards.pop((self._token, filename), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _executor(self):
+        # The executor to score shards with, or None to score them here.
+        if self.executor is not None:
+            return self.executor
+        if self.processes == 0 or multiprocessing.current_process().daemon:
+            return None
+        if self._pool is None:
+            ctx = multiprocessing.get_context("fork")
+            self._pool = ctx.Pool(self.processes)
+        return self._pool
+
+    def _scores_many(self, families, metric):
+        # Score several families against every shard, sending the batch to
+        # each shard once. The accessions are in shard order.
+        if metric == METRIC_JACCARD:
+            queries = [mh.signature_array(f.signature(self.hashes))
+                       for f in families]
+        elif metric == METRIC_CONTAINMENT:
+            queries = [mh.signature_array(f.full_hash(self.hashes))
+                       for f in families]
+        else:
+            raise ValueError("Unknown metric {}".format(metric))
+        tasks = [(self._token, filename, self.n, queries, metric)
+                 for filename, _ in self.shards]
+        executor = self._executor()
+        if executor is None:
+            results = list(map(_score_shard, tasks))
+        else:
+            results = list(executor.map(_score_shard, tasks))
+        accs = [acc for _, shard_accs in self.shards for acc in shard_accs]
+        if not results:
+            return [(accs, np.zeros(0)) for _ in families]
+        return [(accs, np.concatenate(scores)) for scores in zip(*results)]
+
+    def _scores(self, family, metric):
+        return self._scores_many([family], metric)[0]
+
+
+# Shards opened in this process, by the token of the `ShardedHashes` which
+# opened them and filename. Each `ShardedHashes` opens its shards afresh, so
+# a shard rewritten in the meantime is not read stale.
+_open_shards = {}
+
+
+def _score_shard(task):
+    token, filename, n, queries, metric = task
+    try:
+        signatures = _open_shards[token, filename]
+    except KeyError:
+        signatures = np.load(filename, mmap_mode="r")
+        _open_shards[token, filename] = signatures
+    if metric == METRIC_JACCARD:
+        return [mh.jaccard_rows(signatures, q, n) for q in queries]
+    return [mh.containment_rows(signatures, q) for q in queries]
@@ -0,0 +1,251 @@
+"""Generate synthetic Pfam data.
+
+`SyntheticPfam` generates Pfam-like families, regions and clans from a seed,
+which can be written in the formats read by `pfam_file`, or as an SQLite
+database with the tables queried by `pfam_db`, so that Search-Sifter can be
+run and benchmarked without a copy of Pfam.
+"""
+import gzip
+import math
+import random
+import sqlite3
+from collections import OrderedDict
+from ..Family import Family
+from .pfam_file import PFAM_CLANS_FILETYPE_TSV, PFAM_CLANS_FILETYPE_STOCKHOLM
+
+RESIDUES = "ACDEFGHIKLMNPQRSTVWY"
+
+
+class SyntheticPfam(object):
+    """Pfam-like families of protein regions, grouped into clans.
+
+    The number of members of each family follows a log-normal distribution,
+    as in Pfam, where most families are small and a few are very large.
+    Each family matches a region of a similar length in each of its members.
+
+    Families in a clan are related: some of the members of each family after
+    the first are members of an earlier family in the clan, matched by a
+    region overlapping that of the earlier family.
+
+    Parameters
+    ----------
+    families : int
+        The number of families.
+    proteins : int
+        The number of proteins from which members are drawn.
+    members : float
+        The mean number of members of each family.
+    members_sigma : float
+        The standard deviation of the logarithm of the number of members.
+        If 0, every family has `members` members.
+    length : int
+        The mean length of each protein.
+    clan_fraction : float
+        The proportion of families which are in a clan.
+    clan_size : int
+        The mean number of families in each clan.
+    overlap : float
+        The proportion of the members of a family in a clan which are
+        shared with an earlier family in the clan.
+    seed : int
+
+    Attributes
+    ----------
+    regions : OrderedDict
+        Lists of (protein accession, start, end) tuples, keyed by family
+        accession, in order of accession.
+    clans : OrderedDict
+        Sets of family accessions, keyed by clan accession.
+    lengths : dict
+        The length of each protein, keyed by accession.
+    """
+    def __init__(self, families=1000, proteins=20000, members=50,
+                 members_sigma=1.0, length=400, clan_fraction=0.4,
+                 clan_size=4, overlap=0.3, seed=0):
+        rng = random.Random(seed)
+        self.accs = ["P{:06d}".format(i) for i in range(proteins)]
+        self.lengths = {acc: max(50, int(rng.lognormvariate(
+                            math.log(length), 0.3)))
+                        for acc in self.accs}
+        family_accs = ["PF{:05d}".format(i) for i in range(families)]
+
+        self.clans = OrderedDict()
+        in_clans = rng.sample(family_accs, int(families * clan_fraction))
+        while in_clans:
+            size = 1
+            if clan_size > 1:
+                size += int(rng.expovariate(1 / (clan_size - 1)))
+            size = min(len(in_clans), size)
+            clan = "CL{:04d}".format(len(self.clans))
+            self.clans[clan] = set(in_clans[:size])
+            in_clans = in_clans[size:]
+        earlier = {}
+        for clan_families in self.clans.values():
+            ordered = sorted(clan_families)
+            for i, family in enumerate(ordered[1:]):
+                earlier[family] = ordered[:i + 1]
+
+        mu = math.log(members) - members_sigma ** 2 / 2
+        self.regions = OrderedDict()
+        for family in family_accs:
+            size = min(proteins, max(1, int(round(
+                rng.lognormvariate(mu, members_sigma)))))
+            domain = max(10, int(rng.gauss(length / 4, length / 16)))
+            family_regions = []
+            if family in earlier:
+                related = self.regions[rng.choice(earlier[family])]
+                shared = rng.sample(related, min(len(related),
+                                                 int(size * overlap)))
+                for acc, start, end in shared:
+                    shift = rng.randint(-domain // 4, domain // 4)
+                    family_regions.append(self._region(
+                        acc, start + shift, end - start + 1))
+            shared_accs = {acc for acc, _, _ in family_regions}
+            others = [acc for acc in rng.sample(self.accs, size)
+                      if acc not in shared_accs]
+            for acc in others[:size - len(family_regions)]:
+                start = rng.randint(1, max(1, self.lengths[acc] - domain))
+                family_regions.append(self._region(acc, start, domain))
+            self.regions[family] = sorted(family_regions)
+
+    def _region(self, acc, start, domain):
+        # Clip a region to its protein.
+        start = min(max(1, start), self.lengths[acc])
+        return acc, start, min(self.lengths[acc], start + domain - 1)
+
+    def __iter__(self):
+        """Iterate over families and their regions, as `FamiliesRegions`."""
+        for family, regions in self.regions.items():
+            yield family, set(regions)
+
+    def family(self, acc):
+        """Get a family as a `Family`.
+
+        Parameters
+        ----------
+        acc : str
+
+        Returns
+        -------
+        searchsifter.Family
+        """
+        family = Family()
+        for protein, start, end in self.regions[acc]:
+            family.add_region(protein, start, end)
+        family.finalise()
+        return family
+
+
+def write_regions(pfam, filename):
+    """Write families as a gzipped Pfam regions file.
+
+    Parameters
+    ----------
+    pfam : SyntheticPfam
+    filename : str
+    """
+    with gzip.open(filename, 'wt', encoding="latin_1") as regions_file:
+        print("uniprot_acc", "seq_version", "crc64", "md5", "pfamA_acc",
+              "seq_start", "seq_end", sep='\t', file=regions_file)
+        for family, regions in pfam.regions.items():
+            for acc, start, end in regions:
+                print(acc, 1, "", "", family, start, end, sep='\t',
+                      file=regions_file)
+
+
+def write_stockholm(pfam, filename, seed=0):
+    """Write families as a gzipped Pfam Stockholm file.
+
+    Each family is written as an alignment of random sequences, of the
+    length of each region, with an identifier for each protein mapped to its
+    accession.
+
+    Parameters
+    ----------
+    pfam : SyntheticPfam
+    filename : str
+    seed : int
+        The seed for the random sequences.
+    """
+    rng = random.Random(seed)
+    with gzip.open(filename, 'wt', encoding="latin_1") as stockholm_file:
+        for family, regions in pfam.regions.items():
+            print("# STOCKHOLM 1.0", file=stockholm_file)
+            print("#=GF ID   Family_{}".format(family), file=stockholm_file)
+            print("#=GF AC   {}.1".format(family), file=stockholm_file)
+            names = ["{}_SYNTH/{}-{}".format(acc, start, end)
+                     for acc, start, end in regions]
+            for name, (acc, _, _) in zip(names, regions):
+                print("#=GS", name, "AC", "{}.1".format(acc),
+                      file=stockholm_file)
+            for name, (_, start, end) in zip(names, regions):
+                sequence = "".join(rng.choice(RESIDUES)
+                                   for _ in range(end - start + 1))
+                print(name, sequence, file=stockholm_file)
+            print("//", file=stockholm_file)
+
+
+def write_clans(pfam, filename, filetype=PFAM_CLANS_FILETYPE_TSV):
+    """Write clans as a gzipped Pfam clans file.
+
+    Parameters
+    ----------
+    pfam : SyntheticPfam
+    filename : str
+    filetype : tsv (default) or stockholm
+        The format of `Pfam-A.clans.tsv.gz` or of `Pfam-C.gz`.
+    """
+    with gzip.open(filename, 'wt', encoding="latin_1") as clans_file:
+        if filetype == PFAM_CLANS_FILETYPE_TSV:
+            clan_for_family = {f: c for c, fs in pfam.clans.items()
+                               for f in fs}
+            for family in pfam.regions:
+                clan = clan_for_family.get(family, "")
+                print(family, clan, "", "Family_{}".format(family), "",
+                      sep='\t', file=clans_file)
+        elif filetype == PFAM_CLANS_FILETYPE_STOCKHOLM:
+            for clan, families in pfam.clans.items():
+                print("# STOCKHOLM 1.0", file=clans_file)
+                print("#=GF ID   Clan_{}".format(clan), file=clans_file)
+                print("#=GF AC   {}.1".format(clan), file=clans_file)
+                for family in sorted(families):
+                    print("#=GF MB   {};".format(family), file=clans_file)
+                print("//", file=clans_file)
+        else:
+            raise RuntimeError
+
+
+def write_sqlite(pfam, filename):
+    """Write families and clans as an SQLite database.
+
+    The database has the tables, and columns, of the Pfam MySQL database
+    which are queried by `pfam_db`. To use it in place of the MySQL
+    database, set the key `pfam_db.SQLITE_CONFIG_KEY` of the database
+    configuration to `filename`.
+
+    Parameters
+    ----------
+    pfam : SyntheticPfam
+    filename : str
+    """
+    cnx = sqlite3.connect(filename)
+    try:
+        cnx.execute("create table pfamA_reg_full_significant "
+                    "(pfamA_acc text, pfamseq_acc text, "
+                    "ali_start integer, ali_end integer)")
+        cnx.execute("create table clan_membership "
+                    "(clan_acc text, pfamA_acc text)")
+        cnx.executemany("insert into pfamA_reg_full_significant "
+                        "values (?, ?, ?, ?)",
+                        ((family, acc, start, end)
+                         for family, regions in pfam.regions.items()
+                         for acc, start, end in regions))
+        cnx.executemany("insert into clan_membership values (?, ?)",
+                        ((clan, family)
+                         for clan, families in pfam.clans.items()
+                         for family in sorted(families)))
+        cnx.execute("create index family_index "
+                    "on pfamA_reg_full_significant (pfamA_acc)")
+        cnx.commit()
+    finally:
+        cnx.close()
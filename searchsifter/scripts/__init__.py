@@ -1 +1 @@
-from . import time, generate_hashes, generate_residue_hashes, performance
+from . import time, generate_hashes, generate_residue_hashes, performance, benchmark, generate_synthetic_pfam
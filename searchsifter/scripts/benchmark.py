@@ -0,0 +1,287 @@
+"""Benchmark hashing, loading, scoring and sifting on synthetic Pfam data.
+
+Each benchmark is timed on the same synthetic data, generated from a seed at
+a configurable scale, and the best of several runs is reported. Results are
+written as JSON, and may be compared against the results of an earlier run,
+to catch regressions.
+"""
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+from searchsifter import Family
+from searchsifter import sifter as sf
+from searchsifter.Family import clear_signature_cache
+from searchsifter.relationships import minhash as mh
+from searchsifter.relationships import pfam_file, synthetic
+from searchsifter.relationships.pfam import ResidueHashes, ClanMembership
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(function):
+    """Register a benchmark.
+
+    The function is given a `SyntheticData` object, and returns a function
+    of no arguments, which is timed.
+    """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+class SyntheticData(object):
+    """Synthetic Pfam data, and hashes of it, shared by the benchmarks.
+
+    Parameters
+    ----------
+    directory : str
+        A directory in which to write files.
+    families, proteins, members : int
+        See `synthetic.SyntheticPfam`.
+    searches : int
+        The number of families to score against the synthetic Pfam. Each
+        is a Pfam family with some of its regions shifted, and some
+        replaced by regions of other proteins.
+    n : int
+        The signature length.
+    w : int
+        The window size.
+    seed : int
+    """
+    def __init__(self, directory, families=1000, proteins=20000, members=50,
+                 searches=20, n=128, w=50, seed=0):
+        self.n = n
+        self.w = w
+        self.pfam = synthetic.SyntheticPfam(families, proteins, members,
+                                            seed=seed)
+        self.regions = self.pfam.regions
+        self.regions_filename = os.path.join(directory, "regions.tsv.gz")
+        synthetic.write_regions(self.pfam, self.regions_filename)
+        self.pfam_args = (self.regions_filename,
+                          pfam_file.PFAM_FILETYPE_REGIONS)
+        self.hashes = ResidueHashes(w, n=n, pfam=pfam_file,
+                                    pfam_args=self.pfam_args)
+        self.hash_filename = os.path.join(directory, "rhashes.json")
+        self.hashes.save_to_file(self.hash_filename)
+
+        rng = random.Random(seed + 1)
+        accs = list(self.regions)
+        self.searches = []
+        for acc in rng.sample(accs, min(searches, len(accs))):
+            search_regions = []
+            for protein, start, end in self.regions[acc]:
+                if rng.random() < 0.2:
+                    protein = rng.choice(self.pfam.accs)
+                shift = rng.randint(-10, 10)
+                search_regions.append((protein, max(1, start + shift),
+                                       end + shift))
+            search = Family()
+            for protein, start, end in search_regions:
+                search.add_region(protein, start, end)
+            search.finalise()
+            self.searches.append(search)
+        self.clans = ClanMembership(_clans=list(self.pfam.clans.items()))
+
+
+@benchmark
+def signature(data):
+    proteins = [{acc for acc, _, _ in r} for r in data.regions.values()]
+
+    def run():
+        for p in proteins:
+            mh.signature(p, data.n)
+    return run
+
+
+@benchmark
+def hashes_with_windows(data):
+    def run():
+        ResidueHashes.hashes_with_windows([data.w], data.n, pfam=pfam_file,
+                                          pfam_args=data.pfam_args)
+    return run
+
+
+@benchmark
+def load_from_file(data):
+    def run():
+        with open(data.hash_filename) as hash_file:
+            ResidueHashes(data.w, n=data.n, from_file=hash_file)
+    return run
+
+
+@benchmark
+def estimate_jaccard(data):
+    def run():
+        clear_signature_cache()
+        for search in data.searches:
+            data.hashes.estimate_jaccard(search)
+    return run
+
+
+@benchmark
+def estimate_containment(data):
+    def run():
+        clear_signature_cache()
+        for search in data.searches:
+            data.hashes.estimate_containment(search)
+    return run
+
+
+@benchmark
+def overlap(data):
+    def run():
+        for a in data.searches:
+            for b in data.searches:
+                a.overlap(b)
+    return run
+
+
+@benchmark
+def union(data):
+    def run():
+        for a in data.searches:
+            for b in data.searches:
+                a.union(b)
+    return run
+
+
+@benchmark
+def pfam_file_iter(data):
+    def run():
+        for _ in pfam_file.pfam_file_iter(*data.pfam_args):
+            pass
+    return run
+
+
+@benchmark
+def sift(data):
+    def run():
+        clear_signature_cache()
+        terminators = [sf.Terminator() for _ in range(4)]
+        clan_sifter = sf.ClanSifter(0.2, *terminators[2:], clans=data.clans)
+        root = sf.EstimateJaccardSifter(data.hashes, 0.2, 0.9,
+                                        *terminators[:2], clan_sifter)
+        root.sift_batch([sf.package(s, i)
+                         for i, s in enumerate(data.searches)])
+    return run
+
+
+def run_benchmarks(data, names=None, repeat=3):
+    """Time benchmarks.
+
+    Parameters
+    ----------
+    data : SyntheticData
+    names : list of str, optional
+        The benchmarks to run. By default, all are run.
+    repeat : int
+        The number of times to run each benchmark.
+
+    Returns
+    -------
+    dict
+        The shortest time, in seconds, of each benchmark, keyed by name.
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    results = OrderedDict()
+    for name in names:
+        run = BENCHMARKS[name](data)
+        results[name] = min(timeit.repeat(run, number=1, repeat=repeat))
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Compare results against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        As returned by `run_benchmarks`.
+    baseline : dict
+        Results of an earlier run.
+    tolerance : float
+        The largest proportion by which a benchmark may be slower than its
+        baseline without being a regression.
+
+    Returns
+    -------
+    list of (str, float, float, float)
+        For each benchmark in both `results` and `baseline`, its name, its
+        baseline and current times, and the ratio of the current to the
+        baseline time.
+    list of str
+        The names of the benchmarks which have regressed.
+    """
+    comparisons = []
+    regressions = []
+    for name, time in results.items():
+        if name not in baseline:
+            continue
+        ratio = time / baseline[name] if baseline[name] > 0 else 1
+        comparisons.append((name, baseline[name], time, ratio))
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return comparisons, regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--families", type=int, default=1000)
+    parser.add_argument("-P", "--proteins", type=int, default=20000)
+    parser.add_argument("-m", "--members", type=int, default=50)
+    parser.add_argument("-s", "--searches", type=int, default=20)
+    parser.add_argument("-n", type=int, default=128)
+    parser.add_argument("-w", "--window", type=int, default=50)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-k", "--benchmarks", nargs='+',
+                        choices=list(BENCHMARKS))
+    parser.add_argument("-o", "--output", type=str)
+    parser.add_argument("-c", "--baseline", type=str)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scale = OrderedDict([("families", args.families),
+                         ("proteins", args.proteins),
+                         ("members", args.members),
+                         ("searches", args.searches),
+                         ("n", args.n), ("w", args.window),
+                         ("seed", args.seed)])
+    with tempfile.TemporaryDirectory() as directory:
+        data = SyntheticData(directory, families=args.families,
+                             proteins=args.proteins, members=args.members,
+                             searches=args.searches, n=args.n,
+                             w=args.window, seed=args.seed)
+        results = run_benchmarks(data, args.benchmarks, args.repeat)
+
+    for name, time in results.items():
+        print(name, "{:.4f}".format(time), sep='\t')
+    if args.output is not None:
+        with open(args.output, 'x') as output_file:
+            json.dump({"python": platform.python_version(),
+                       "compiled_kernels": mh.COMPILED_KERNELS,
+                       "scale": scale, "results": results},
+                      output_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["scale"] != scale:
+            print("Warning: the baseline was run at a different scale",
+                  file=sys.stderr)
+        comparisons, regressions = compare(results, baseline["results"],
+                                           args.tolerance)
+        print()
+        for name, before, after, ratio in comparisons:
+            print(name, "{:.4f}".format(before), "{:.4f}".format(after),
+                  "{:.2f}x".format(ratio),
+                  "REGRESSION" if name in regressions else "", sep='\t')
+        if regressions:
+            sys.exit(1)
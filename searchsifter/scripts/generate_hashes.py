@@ -15,6 +15,7 @@ if __name__ == '__main__':
     parser.add_argument("-o", "--output-dir", type=str, default='')
     parser.add_argument("-p", "--pfam-filename", type=str)
     parser.add_argument("-t", "--pfam-file-type", type=str, choices=["regions", "stockholm"])
+    parser.add_argument("-b", "--hash-bits", type=int, choices=[32, 64], default=32)
     args = parser.parse_args()
     if args.pfam_filename is not None:
         pfam = ss.relationships.pfam_file
@@ -24,5 +25,6 @@ if __name__ == '__main__':
     else:
         pfam = ss.relationships.pfam_db
         pfam_args = None
-    hashes = ss.relationships.pfam.Hashes(n=args.n, pfam=pfam, pfam_args=pfam_args)
+    hashes = ss.relationships.pfam.Hashes(n=args.n, pfam=pfam, pfam_args=pfam_args,
+                                          hash_bits=args.hash_bits)
     hashes.save_to_file(hash_location(args.output_dir))
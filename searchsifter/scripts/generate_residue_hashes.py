@@ -4,13 +4,27 @@ import os
 import time
 
 
-def hash_location(o, w):
+def hash_location(o, w, compress=False, hashes_only=False):
+    if hashes_only:
+        return os.path.join(o, "rhashes_{}.npz".format(w))
+    if compress:
+        return os.path.join(o, "rhashes_{}.shc".format(w))
     return os.path.join(o, "rhashes_{}.json".format(w))
 
 
 def size_location(o, w):
     return os.path.join(o, "sizes_{}.json".format(w))
 
+
+def clan_hash_location(o, w, compress=False):
+    if compress:
+        return os.path.join(o, "crhashes_{}.shc".format(w))
+    return os.path.join(o, "crhashes_{}.json".format(w))
+
+
+def clan_size_location(o):
+    return os.path.join(o, "crsizes.json")
+
 if __name__ == '__main__':
     import argparse
 
@@ -20,6 +34,12 @@ if __name__ == '__main__':
     parser.add_argument("-o", "--output-dir", type=str, default='')
     parser.add_argument("-p", "--pfam-filename", type=str)
     parser.add_argument("-t", "--pfam-file-type", type=str)
+    parser.add_argument("-c", "--clans", action="store_true")
+    parser.add_argument("-z", "--compress", action="store_true")
+    parser.add_argument("-a", "--hashes-only", action="store_true")
+    parser.add_argument("-b", "--hash-bits", type=int, choices=[32, 64], default=32)
+    parser.add_argument("--pfam-clans-filename", type=str)
+    parser.add_argument("--pfam-clans-file-type", type=str, choices=["tsv", "stockholm"])
     args = parser.parse_args()
     if args.pfam_filename is not None:
         pfam = relationships.pfam_file
@@ -29,8 +49,37 @@ if __name__ == '__main__':
     else:
         pfam = relationships.pfam_db
         pfam_args = None
-    hashes = pf.ResidueHashes.hashes_with_windows(args.windows, args.n, pfam=pfam, pfam_args=pfam_args)
+    clans_args = None
+    if args.pfam_clans_filename is not None:
+        clans_args = [args.pfam_clans_filename]
+        if args.pfam_clans_file_type is not None:
+            clans_args.append(args.pfam_clans_file_type)
+    elif args.clans and args.pfam_filename is not None:
+        parser.error("--pfam-clans-filename is required to use clans with a Pfam file")
+    hashes = pf.ResidueHashes.hashes_with_windows(args.windows, args.n, pfam=pfam, pfam_args=pfam_args,
+                                                  hash_bits=args.hash_bits, clans_args=clans_args)
     for w, h in hashes.items():
         t = time.time()
-        h.save_to_file(hash_location(args.output_dir, w))
+        if args.hashes_only:
+            pf.HashArrays(h).save_to_file(
+                hash_location(args.output_dir, w, hashes_only=True),
+                provenance=True)
+        else:
+            h.save_to_file(hash_location(args.output_dir, w, args.compress),
+                           compress=args.compress)
         print("Generated hash with w={} in {} seconds".format(w, time.time() - t))
+    if args.clans:
+        if args.pfam_clans_filename is not None:
+            clans = list(relationships.pfam_file.Clans(*clans_args))
+        else:
+            clans = list(pfam.Clans())
+        for w, h in hashes.items():
+            t = time.time()
+            h.clan_hashes(clans).save_to_file(
+                clan_hash_location(args.output_dir, w, args.compress),
+                compress=args.compress)
+            print("Generated clan hash with w={} in {} seconds".format(w, time.time() - t))
+        t = time.time()
+        sizes = pf.ResidueSizes(pfam=pfam, pfam_args=pfam_args, clans_args=clans_args)
+        sizes.clan_sizes(clans).save_to_file(clan_size_location(args.output_dir))
+        print("Generated clan sizes in {} seconds".format(time.time() - t))
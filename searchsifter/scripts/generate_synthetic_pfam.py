@@ -0,0 +1,59 @@
+import json
+import os
+from searchsifter.relationships import synthetic
+from searchsifter.relationships.pfam_db import SQLITE_CONFIG_KEY
+
+
+def regions_location(o):
+    return os.path.join(o, "Pfam-A.regions.uniprot.tsv.gz")
+
+
+def stockholm_location(o):
+    return os.path.join(o, "Pfam-A.full.uniprot.gz")
+
+
+def clans_location(o):
+    return os.path.join(o, "Pfam-A.clans.tsv.gz")
+
+
+def sqlite_location(o):
+    return os.path.join(o, "pfam.sqlite")
+
+
+def db_config_location(o):
+    return os.path.join(o, "db.json")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output-dir", type=str, default='')
+    parser.add_argument("-f", "--families", type=int, default=1000)
+    parser.add_argument("-P", "--proteins", type=int, default=20000)
+    parser.add_argument("-m", "--members", type=float, default=50)
+    parser.add_argument("--members-sigma", type=float, default=1.0)
+    parser.add_argument("-l", "--length", type=int, default=400)
+    parser.add_argument("--clan-fraction", type=float, default=0.4)
+    parser.add_argument("--clan-size", type=int, default=4)
+    parser.add_argument("--overlap", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-s", "--stockholm", action="store_true")
+    parser.add_argument("-d", "--sqlite", action="store_true")
+    args = parser.parse_args()
+
+    pfam = synthetic.SyntheticPfam(
+        families=args.families, proteins=args.proteins, members=args.members,
+        members_sigma=args.members_sigma, length=args.length,
+        clan_fraction=args.clan_fraction, clan_size=args.clan_size,
+        overlap=args.overlap, seed=args.seed)
+    synthetic.write_regions(pfam, regions_location(args.output_dir))
+    synthetic.write_clans(pfam, clans_location(args.output_dir))
+    if args.stockholm:
+        synthetic.write_stockholm(pfam, stockholm_location(args.output_dir),
+                                  seed=args.seed)
+    if args.sqlite:
+        synthetic.write_sqlite(pfam, sqlite_location(args.output_dir))
+        with open(db_config_location(args.output_dir), 'x') as config_file:
+            json.dump({SQLITE_CONFIG_KEY: os.path.abspath(
+                sqlite_location(args.output_dir))}, config_file)
@@ -4,14 +4,17 @@ import json
 
 
 def exact_jaccard(test_accs, pfam_accs, family_source):
+    space = relationships.jaccard.ResidueSpace()
+    test_sets = {test_acc: space.encode(family_source(test_acc))
+                 for test_acc in test_accs}
     for pfam_acc in pfam_accs:
-        pfam_fam = family_source(pfam_acc)
+        pfam_set = space.encode(family_source(pfam_acc))
         for test_acc in test_accs:
-            test_fam = family_source(test_acc)
-            intersect = sum(len(r) for _, rs in pfam_fam.overlap(test_fam).items() for r in rs)
-            union = sum(len(r) for _, rs in pfam_fam.union(test_fam).items() for r in rs)
+            test_set = test_sets[test_acc]
+            intersect = pfam_set.intersection_cardinality(test_set)
+            union = len(pfam_set) + len(test_set) - intersect
             ji = intersect / union
-            jc = intersect / pfam_fam.residues_covered()
+            jc = intersect / len(pfam_set)
             yield pfam_acc, test_acc, ji, jc
 
 
@@ -50,7 +53,11 @@ if __name__ == "__main__":
     hash_paths = [p for p in args.hashes for q in glob(p)]
 
     with open(hash_paths[0]) as hash_file:
-        all_pfam = json.load(hash_file).keys()
+        hash_data = json.load(hash_file)
+        # Versioned files hold the signatures under a key of their own.
+        if "version" in hash_data:
+            hash_data = hash_data["signatures"]
+        all_pfam = hash_data.keys()
 
     if args.pfam_filename is not None:
         pfam_db = relationships.pfam_file.PfamFamilies(args.pfam_filename, args.pfam_file_type, all_pfam)
@@ -1,9 +1,18 @@
-from searchsifter.relationships.pfam import Hashes, PfamFamily, Clans
+from searchsifter.relationships.pfam import (Hashes, ClanMembership,
+                                             METRIC_JACCARD,
+                                             METRIC_CONTAINMENT)
+from searchsifter.relationships import pfam_db
 from searchsifter import Family
-import operator
-from functools import reduce
+from collections import defaultdict
+from itertools import islice
 import abc
-import copy
+import csv
+import gc
+import gzip
+import io
+import json
+import multiprocessing
+import threading
 
 
 SIFTS = "sifts"
@@ -20,6 +29,15 @@ SEARCH_SIZE = "search_size"
 
 
 class Sifter(abc.ABC):
+    """A stage of the sifting pipeline.
+
+    Each packaged search is annotated by the sifter, then sent on to one of
+    its named sinks, which are themselves sifters.
+
+    Searches may be sifted one at a time with `sift`, or as a list with
+    `sift_batch`. In the latter case, the batch is partitioned among the
+    sinks, so each downstream stage also receives a batch.
+    """
     def __init__(self, **sinks):
         self.sinks = sinks
 
@@ -27,92 +45,541 @@ class Sifter(abc.ABC):
         for sink, data in sinks.items():
             self.sinks[sink].sift(data)
 
+    def _distribute_batches(self, **sinks):
+        for sink, batch in sinks.items():
+            if len(batch) > 0:
+                self.sinks[sink].sift_batch(batch)
+
+    def _annotate(self, data):
+        # Searches are annotated in place, rather than copied at each stage.
+        data.sifts.append(self)
+        return data
+
     @abc.abstractmethod
+    def route(self, data):
+        """Annotate a packaged search, and choose the sink it is sent to.
+
+        Parameters
+        ----------
+        data : dict
+            A packaged search, as returned by `package`.
+
+        Returns
+        -------
+        sink : str
+            The name of the sink to which the search should be sent.
+        out_data : dict
+            The annotated search.
+        """
+
+    def route_batch(self, batch):
+        """Annotate and choose sinks for a list of packaged searches.
+
+        By default, each search is routed in turn. Sifters which can score
+        several searches together should override this.
+
+        Parameters
+        ----------
+        batch : list of dict
+
+        Returns
+        -------
+        list of (str, dict)
+            The sink and annotated search, as returned by `route`, for each
+            search in the batch.
+        """
+        return [self.route(data) for data in batch]
+
     def sift(self, data):
-        out_data = copy.copy(data)
-        out_data[SIFTS].append(self)
-        return out_data
+        """Sift a packaged search, sending it to the appropriate sink."""
+        sink, out_data = self.route(data)
+        self._distribute_results(**{sink: out_data})
+
+    def sift_batch(self, batch):
+        """Sift a list of packaged searches, partitioning them among sinks."""
+        partitions = defaultdict(list)
+        for sink, out_data in self.route_batch(batch):
+            partitions[sink].append(out_data)
+        self._distribute_batches(**partitions)
+
+
+class SiftRecord(object):
+    """A packaged search, annotated by each of the sifters it passes through.
+
+    Per-family values are held sparsely, as lists aligned with `families`,
+    the Pfam families which scored above zero. Dictionaries keyed by family
+    are built only when asked for, through the properties named after the
+    module's key constants.
+
+    Fields can be accessed as attributes, or by key, e.g. `record[ID]`.
+    Fields which have not been set by any sifter are None.
+    """
+    __slots__ = (SEARCH, ID, SIFTS, SEARCH_SIZE, CLANS,
+                 "families", "scores", "sizes")
+
+    def __init__(self, search, id_):
+        self.search = search
+        self.id = id_
+        self.sifts = []
+        self.search_size = None
+        self.clans = None
+        self.families = None
+        self.scores = None
+        self.sizes = None
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def items(self):
+        """Iterate over the fields which have been set, and their values."""
+        for key in [SEARCH, ID, SIFTS, FAMILY_HASH_SCORES, SEARCH_SIZE,
+                    ABSOLUTE_SIZES, RELATIVE_SIZES,
+                    NORMALISED_FAMILY_HASH_SCORES, CLANS]:
+            value = self[key]
+            if value is not None:
+                yield key, value
+
+    @property
+    def family_hash_scores(self):
+        if self.families is None:
+            return None
+        return dict(zip(self.families, self.scores))
+
+    @family_hash_scores.setter
+    def family_hash_scores(self, scores):
+        self.families = list(scores.keys())
+        self.scores = list(scores.values())
+
+    @property
+    def absolute_sizes(self):
+        if self.sizes is None:
+            return None
+        return dict(zip(self.families, self.sizes))
+
+    @property
+    def relative_sizes(self):
+        if self.sizes is None:
+            return None
+        return {f: self.search_size / s
+                for f, s in zip(self.families, self.sizes)}
+
+    @property
+    def normalised_family_hash_scores(self):
+        if self.sizes is None:
+            return None
+        return {f: (s * size) / self.search_size
+                for f, s, size in zip(self.families, self.scores, self.sizes)}
 
 
 def package(search, id_):
-    return {SEARCH: search,
-            ID: id_,
-            SIFTS: []}
+    return SiftRecord(search, id_)
 
 
 class HashSifter(Sifter):
+    """Route searches by their scores against Pfam.
+
+    If *all* families score at most `low_threshold`, searches are sent to the
+    low sink. Else, if *any* family scores at least `high_threshold`, and it
+    is the only family scoring at least `low_threshold`, searches are sent
+    to the high sink. Otherwise, they are sent to the other sink.
+
+    If the sifter has a `batch_sift_method`, the name of a method of
+    `hashes` scoring a list of searches, batches are scored with it.
+
+    If `prune` is set, and the sifter has a `metric`, searches are scored with
+    `Hashes.estimate_above`, so that only families scoring at least
+    `low_threshold` are scored, and recorded. Searches are routed as they
+    would be without pruning, but the sifters after this one see only the
+    recorded families. So they route as they would without pruning only if
+    they ignore families scoring below `low_threshold`, e.g. a `ClanSifter`
+    whose threshold is at least `low_threshold`.
+
+    Families scoring 0 are never recorded, nor counted as reaching
+    `low_threshold`, even if it is 0.
+    """
     def __init__(self, hashes, low_threshold, high_threshold,
                  low_sink, high_sink, other_sink, sift_method=None,
-                 sizes=None):
+                 sizes=None, batch_sift_method=None, metric=None,
+                 prune=False):
         if sift_method is None:
             raise RuntimeError
+        if prune and metric is None:
+            raise ValueError
         super().__init__(low_sink=low_sink,
                          high_sink=high_sink,
                          other_sink=other_sink)
         self.hashes = hashes
         self.sift_method = sift_method
+        self.batch_sift_method = batch_sift_method
+        self.metric = metric
+        self.prune = prune
         self.low_threshold = low_threshold
         self.high_threshold = high_threshold
         self.sizes = sizes
 
-    def sift(self, data):
-        out_data = super().sift(data)
+    def route(self, data):
+        if self.prune:
+            scores, max_score = self.hashes.estimate_above(
+                data[SEARCH], self.low_threshold, self.metric)
+            return self._route_scores(data, scores, max_score)
         scores = self.sift_method(data[SEARCH], self.hashes)
-        out_data[FAMILY_HASH_SCORES] = {f: s for f, s in scores.items() if s > 0}
-
-        # If *all* families are below the low threshold, send the result to
-        # the low sink. Else, if *any* of the families are above the high
-        # threshold, send to the high sink. Else, send to the other sink.
-        if reduce(operator.and_, (v <= self.low_threshold for v in scores.values())):
-            self._distribute_results(low_sink=out_data)
-        elif (reduce(operator.or_, (v >= self.high_threshold for v in scores.values()))
-            and sum(v >= self.low_threshold for v in scores.values()) == 1):
-            self._distribute_results(high_sink=out_data)
+        return self._route_scores(data, scores)
+
+    def route_batch(self, batch):
+        if self.prune or self.batch_sift_method is None:
+            return super().route_batch(batch)
+        # The method is looked up on the hashes, so that subclasses of
+        # Hashes, and other scorers, can provide their own.
+        batch_sift_method = getattr(self.hashes, self.batch_sift_method)
+        all_scores = batch_sift_method([data[SEARCH] for data in batch])
+        return [self._route_scores(data, scores)
+                for data, scores in zip(batch, all_scores)]
+
+    def _route_scores(self, data, scores, max_score=None):
+        out_data = self._annotate(data)
+        out_data.families = []
+        out_data.scores = []
+        above_low = 0
+        for f, s in scores.items():
+            if s > 0:
+                out_data.families.append(f)
+                out_data.scores.append(s)
+                if s >= self.low_threshold:
+                    above_low += 1
+        if max_score is None:
+            max_score = max(out_data.scores, default=0)
+
+        if max_score <= self.low_threshold:
+            return "low_sink", out_data
+        elif max_score >= self.high_threshold and above_low == 1:
+            return "high_sink", out_data
         else:
-            self._distribute_results(other_sink=out_data)
+            return "other_sink", out_data
 
 
 class Terminator(Sifter):
     def __init__(self):
+        super().__init__()
         self.results = {}
 
+    def route(self, data):
+        return None, self._annotate(data)
+
     def sift(self, data):
-        out_data = super().sift(data)
-        self.results[data[ID]] = out_data
+        _, out_data = self.route(data)
+        self._store(data[ID], out_data)
+
+    def sift_batch(self, batch):
+        for data in batch:
+            self.sift(data)
+
+    def _store(self, id_, out_data):
+        self.results[id_] = out_data
+
+
+class StreamingTerminator(Terminator):
+    """A Terminator which writes each result to a file as it arrives.
+
+    Results are not held in memory, so there is no `results` attribute.
+    Searches themselves are not written, and
+    sifters are written as their class names. Files can be read back lazily
+    with `read`.
+
+    Parameters
+    ----------
+    filename : str
+        The path to write to. There must not already be a file there.
+    compress : bool
+        Whether to gzip the output.
+    buffer_size : int
+        The size in bytes of the write buffer.
+    """
+    def __init__(self, filename, compress=False,
+                 buffer_size=io.DEFAULT_BUFFER_SIZE):
+        # Skip Terminator.__init__, which creates the `results` dict that
+        # this class never fills.
+        Sifter.__init__(self)
+        self.filename = filename
+        self._raw_file = open(filename, 'xb', buffering=buffer_size)
+        if compress:
+            out_file = gzip.GzipFile(fileobj=self._raw_file, mode='wb')
+        else:
+            out_file = self._raw_file
+        self._file = io.TextIOWrapper(out_file, encoding="utf-8", newline='')
+
+    def close(self):
+        """Flush any buffered results, and close the file."""
+        # Closing a GzipFile does not close the file object it wraps.
+        self._file.close()
+        self._raw_file.close()
 
+    def __enter__(self):
+        return self
 
-def make_hash_sifter(sift_method):
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _store(self, id_, out_data):
+        self._write(_serialisable(out_data))
+
+    @abc.abstractmethod
+    def _write(self, result):
+        pass
+
+    @staticmethod
+    def _open(filename):
+        # Open a file for reading, whether or not it was compressed.
+        with open(filename, 'rb') as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        if compressed:
+            return gzip.open(filename, 'rt', encoding="utf-8", newline='')
+        return open(filename, encoding="utf-8", newline='')
+
+
+class JSONLinesTerminator(StreamingTerminator):
+    """A StreamingTerminator which writes one JSON object per result."""
+    def _write(self, result):
+        self._file.write(json.dumps(result))
+        self._file.write('\n')
+
+    @classmethod
+    def read(cls, filename):
+        """Lazily read results written by a JSONLinesTerminator.
+
+        Parameters
+        ----------
+        filename : str
+
+        Yields
+        ------
+        dict
+            A result, with the same keys as those stored by `Terminator`,
+            except for the search.
+        """
+        with cls._open(filename) as result_file:
+            for line in result_file:
+                yield json.loads(line)
+
+
+class TSVTerminator(StreamingTerminator):
+    """A StreamingTerminator which writes a tab separated table.
+
+    There is one row for each Pfam family scored for each search, or a
+    single row with an empty family if none were scored. Values which are
+    not recorded for a search are left empty.
+    """
+    COLUMNS = [ID, SIFTS, SEARCH_SIZE, "family", FAMILY_HASH_SCORES,
+               NORMALISED_FAMILY_HASH_SCORES, ABSOLUTE_SIZES, RELATIVE_SIZES,
+               CLANS]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writer = csv.writer(self._file, delimiter='\t',
+                                  lineterminator='\n')
+        self._writer.writerow(self.COLUMNS)
+
+    def _write(self, result):
+        families = result.get(FAMILY_HASH_SCORES) or {None: None}
+        for family in families:
+            row = [result[ID], ','.join(result[SIFTS]),
+                   result.get(SEARCH_SIZE), family]
+            for column in self.COLUMNS[4:]:
+                row.append((result.get(column) or {}).get(family))
+            self._writer.writerow(['' if v is None else v for v in row])
+
+    @classmethod
+    def read(cls, filename):
+        """Lazily read results written by a TSVTerminator.
+
+        Values are read back as strings. Rows are grouped by search, so that
+        each result has the same layout as one written by a
+        JSONLinesTerminator.
+
+        Parameters
+        ----------
+        filename : str
+
+        Yields
+        ------
+        dict
+        """
+        with cls._open(filename) as result_file:
+            reader = csv.DictReader(result_file, delimiter='\t')
+            current = None
+            for row in reader:
+                if current is None or row[ID] != current[ID]:
+                    if current is not None:
+                        yield current
+                    current = {ID: row[ID],
+                               SIFTS: row[SIFTS].split(','),
+                               SEARCH_SIZE: row[SEARCH_SIZE] or None}
+                    for column in cls.COLUMNS[4:]:
+                        current[column] = {}
+                family = row["family"]
+                if family:
+                    for column in cls.COLUMNS[4:]:
+                        if row[column]:
+                            current[column][family] = row[column]
+            if current is not None:
+                yield current
+
+
+def _serialisable(out_data):
+    result = {k: v for k, v in out_data.items() if k != SEARCH}
+    result[SIFTS] = [type(s).__name__ for s in out_data[SIFTS]]
+    return result
+
+
+def sift_parallel(root, searches, processes=None, batch_size=100):
+    """Sift a stream of packaged searches across a pool of worker processes.
+
+    Workers are forked from this process, so each shares the sifter graph,
+    including its `Hashes` and `Sizes`, without copying or pickling it.
+    Searches are sent to the workers in batches and sifted with
+    `Sifter.sift_batch`. The results are merged into the `Terminator`s of
+    the graph in this process, as if the searches had been sifted here.
+
+    Parameters
+    ----------
+    root : Sifter
+        The first sifter of the graph.
+    searches : iterable of dict
+        Packaged searches, as returned by `package`. Their IDs must be unique.
+    processes : int, optional
+        The number of worker processes. By default, the number of CPUs.
+    batch_size : int
+        The number of searches sent to a worker at a time.
+    """
+    nodes = _graph_nodes(root)
+    # The searches sent to the workers, by ID. Batches are drawn from the
+    # generator by the pool's task thread, so access is guarded by a lock.
+    pending = {}
+    pending_lock = threading.Lock()
+
+    def batches():
+        it = iter(searches)
+        while True:
+            batch = list(islice(it, batch_size))
+            if len(batch) == 0:
+                return
+            with pending_lock:
+                for data in batch:
+                    pending[data[ID]] = data[SEARCH]
+            yield batch
+
+    # Objects which survive garbage collection now are moved out of its reach,
+    # so that collections in the workers don't touch, and copy, their pages.
+    # If the caller has frozen objects itself, the collector is left alone,
+    # as unfreezing would unfreeze the caller's objects too.
+    freeze = gc.get_freeze_count() == 0
+    if freeze:
+        gc.freeze()
+    try:
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(processes, initializer=_init_worker,
+                      initargs=(nodes,)) as pool:
+            for results in pool.imap_unordered(_sift_in_worker, batches()):
+                for index, id_, out_data in results:
+                    with pending_lock:
+                        out_data[SEARCH] = pending.pop(id_)
+                    out_data[SIFTS] = [nodes[i] for i in out_data[SIFTS]]
+                    nodes[index]._store(id_, out_data)
+    finally:
+        if freeze:
+            gc.unfreeze()
+
+
+def _graph_nodes(root):
+    # List every sifter reachable from root, in a deterministic order, so
+    # that sifters can be referred to by index across processes.
+    nodes = []
+    seen = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        nodes.append(node)
+        stack.extend(reversed(list(node.sinks.values())))
+    return nodes
+
+
+_worker_nodes = None
+_worker_results = []
+
+
+def _init_worker(nodes):
+    global _worker_nodes
+    _worker_nodes = nodes
+    # Terminators in the workers collect results to return to the parent,
+    # rather than storing or writing them.
+    for i, node in enumerate(nodes):
+        if isinstance(node, Terminator):
+            node._store = (lambda id_, out_data, i=i:
+                           _worker_results.append((i, id_, out_data)))
+
+
+def _sift_in_worker(batch):
+    _worker_results.clear()
+    _worker_nodes[0].sift_batch(batch)
+
+    # Sifters are replaced by their index, and searches are dropped, as they
+    # may hold references to large objects such as Hashes in their caches.
+    # Both are restored in the parent.
+    indices = {id(n): i for i, n in enumerate(_worker_nodes)}
+    out = []
+    for i, id_, out_data in _worker_results:
+        out_data[SEARCH] = None
+        out_data[SIFTS] = [indices[id(s)] for s in out_data[SIFTS]]
+        out.append((i, id_, out_data))
+    return out
+
+
+def make_hash_sifter(sift_method, batch_sift_method=None, metric=None):
     class S(HashSifter):
         def __init__(self, *args, **kwargs):
-            super().__init__(*args, sift_method=sift_method, **kwargs)
+            super().__init__(*args, sift_method=sift_method,
+                             batch_sift_method=batch_sift_method,
+                             metric=metric, **kwargs)
     return S
 
 
 EstimateJaccardSifter = make_hash_sifter(
-    Family.estimate_jaccard_with_pfam)
+    Family.estimate_jaccard_with_pfam,
+    "estimate_jaccard_many",
+    METRIC_JACCARD)
 
 EstimateContainmentSifter = make_hash_sifter(
-    Family.estimate_containment_with_pfam)
+    Family.estimate_containment_with_pfam,
+    "estimate_containment_many",
+    METRIC_CONTAINMENT)
 
 
 class ClanSifter(Sifter):
-    def __init__(self, threshold, same_sink, different_sink):
+    def __init__(self, threshold, same_sink, different_sink, clans=None):
         super().__init__(same_sink=same_sink, different_sink=different_sink)
         self.threshold = threshold
-
-    def sift(self, data):
-        out_data = super().sift(data)
-        threshold_families = {f: s for f, s in data[FAMILY_HASH_SCORES].items() if s > self.threshold}
+        if clans is None:
+            clans = ClanMembership.shared(pfam=pfam_db)
+        self.clans = clans
+
+    def route(self, data):
+        out_data = self._annotate(data)
+        threshold_families = [f for f, s in zip(data.families, data.scores)
+                              if s > self.threshold]
         if len(threshold_families) <= 1:
-            self._distribute_results(same_sink=out_data)
+            return "same_sink", out_data
 
-        clans = {f: Clans().clan_for_family(f)
-                    for f, s in threshold_families.items()}
-        out_data[CLANS] = clans
-        if len(set(clans.values())) == 1 and None not in clans:
-            self._distribute_results(same_sink=out_data)
+        clans = {f: self.clans.clan_for_family(f) for f in threshold_families}
+        out_data.clans = clans
+        if len(set(clans.values())) == 1 and None not in clans.values():
+            return "same_sink", out_data
         else:
-            self._distribute_results(different_sink=out_data)
+            return "different_sink", out_data
 
 
 class SizeSifter(Sifter):
@@ -125,30 +592,25 @@ class SizeSifter(Sifter):
         self.rel_threshold = rel_threshold
         self.sizes = sizes
 
-    def sift(self, data):
-        out_data = super().sift(data)
-
-        abs_sizes = {f: self.sizes.sizes[f] for f, _ in data[FAMILY_HASH_SCORES].items()}
-        out_data[ABSOLUTE_SIZES] = abs_sizes
-        search_size = self.sizes.size_method(data[SEARCH])
-        out_data[SEARCH_SIZE] = search_size
-        rel_sizes = {f: search_size / s for f, s in abs_sizes.items()}
-        out_data[RELATIVE_SIZES] = rel_sizes
-        normalised_scores = {f: (s * self.sizes.sizes[f]) / search_size
-                             for f, s in data[FAMILY_HASH_SCORES].items()
-                             if s > 0}
-        out_data[NORMALISED_FAMILY_HASH_SCORES] = normalised_scores
+    def route(self, data):
+        out_data = self._annotate(data)
+        sizes = self.sizes.sizes
+        out_data.sizes = [sizes[f] for f in data.families]
+        search_size = self.sizes.size_method(data.search)
+        out_data.search_size = search_size
+
         bigger = True
         if self.abs_threshold is not None:
-            if sum(s < self.abs_threshold for s in abs_sizes.values()) > 0:
-                bigger |= False
+            if any(s < self.abs_threshold for s in out_data.sizes):
+                bigger = False
         if self.rel_threshold is not None:
-            if sum(r < self.rel_threshold for r in rel_sizes.values()) > 0:
-                bigger |= False
+            if any(search_size / s < self.rel_threshold
+                   for s in out_data.sizes):
+                bigger = False
         if bigger:
-            self._distribute_results(bigger_sink=out_data)
+            return "bigger_sink", out_data
         else:
-            self._distribute_results(smaller_sink=out_data)
+            return "smaller_sink", out_data
 
 
 class NewFamilySifter(Sifter):
@@ -157,17 +619,17 @@ class NewFamilySifter(Sifter):
         self.abs_threshold = abs_threshold
         self.rel_threshold = rel_threshold
 
-    def sift(self, data):
-        out_data = super().sift(data)
-        search_size = data[SEARCH_SIZE]
-        normalised_scores = data[NORMALISED_FAMILY_HASH_SCORES]
+    def route(self, data):
+        out_data = self._annotate(data)
+        search_size = data.search_size
 
         if search_size < self.abs_threshold:
-            self._distribute_results(other_sink=out_data)
-        elif len([s for s in normalised_scores.values() if s > self.rel_threshold]) > 0:
-            self._distribute_results(other_sink=out_data)
+            return "other_sink", out_data
+        elif any((s * size) / search_size > self.rel_threshold
+                 for s, size in zip(data.scores, data.sizes)):
+            return "other_sink", out_data
         else:
-            self._distribute_results(new_sink=out_data)
+            return "new_sink", out_data
 
 class BiggerBetterSifter(Sifter):
     def __init__(self, bigger_threshold, better_threshold,
@@ -177,5 +639,5 @@ class BiggerBetterSifter(Sifter):
         self.bigger_threshold = bigger_threshold
         self.better_threshold = better_threshold
 
-    def sift(self, data):
-        out_data = super().sift(data)
+    def route(self, data):
+        out_data = self._annotate(data)
@@ -1,12 +1,28 @@
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 import versioneer
 
+# The compiled MinHash kernels are optional; without Cython, or if they fail
+# to build, the NumPy implementations in searchsifter.relationships.minhash
+# are used instead.
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize([
+        Extension("searchsifter.relationships._minhash_kernels",
+                  ["searchsifter/relationships/_minhash_kernels.pyx"],
+                  optional=True),
+    ])
+
 setup(name='SearchSifter',
       packages=find_packages(),
       include_package_data=True,
       install_requires=[
           "pymysql",
+          "numpy",
       ],
+      ext_modules=ext_modules,
       version=versioneer.get_version(),
       cmdclass=versioneer.get_cmdclass(),
       )
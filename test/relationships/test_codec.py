@@ -0,0 +1,46 @@
+import random
+import pytest
+from searchsifter.relationships import codec
+from searchsifter.relationships import minhash as mh
+from searchsifter.relationships import pfam as pf
+
+
+def test_varints():
+    values = [0, 1, 127, 128, 300, 2 ** 32 - 1, 2 ** 64]
+    data = bytearray()
+    codec.encode_varints(values, data)
+    assert codec.decode_varints(bytes(data), 0, len(values)) == \
+        (values, len(data))
+
+
+@pytest.mark.parametrize("residues", [False, True])
+def test_round_trip(tmp_path, residues):
+    rng = random.Random(0)
+    proteins = ["P{:05}".format(i) for i in range(500)]
+    if residues:
+        hashes = pf.ResidueHashes(10, 20)
+        elements = [(p, c) for p in proteins for c in range(3)]
+    else:
+        hashes = pf.Hashes(20)
+        elements = proteins
+    hashes._hashes = {"PF{:05}".format(i):
+                      mh.signature(rng.sample(elements, rng.randint(0, 40)), 20)
+                      for i in range(600)}
+    filename = str(tmp_path / "hashes.shc")
+    hashes.save_to_file(filename, compress=True)
+    with open(filename, "rb") as f:
+        reader = codec.SignatureReader(f)
+    assert reader.families == list(hashes.hashes)
+    assert reader["PF00321"] == hashes.hashes["PF00321"]
+    with open(filename, "rb") as f:
+        loaded = type(hashes)(*([10] if residues else []), n=20, from_file=f)
+    assert loaded.hashes == hashes.hashes
+
+
+def test_varint_array():
+    values = [0, 1, 127, 128, 300, 2 ** 32 - 1, 2 ** 64 - 1]
+    data = bytearray(b"x")
+    codec.encode_varints(values + [5], data)
+    decoded, pos = codec.decode_varint_array(bytes(data), 1, len(values))
+    assert decoded.tolist() == values
+    assert codec.decode_varints(bytes(data), pos, 1)[0] == [5]
@@ -1,5 +1,11 @@
+import gc
+import weakref
 import pytest
-from searchsifter.Family import Family, _merge_ranges
+from searchsifter.Family import (Family, _merge_ranges, signature_cache_info,
+                                 set_signature_cache_size,
+                                 clear_signature_cache)
+from searchsifter.relationships.pfam import ResidueHashes
+from searchsifter.relationships.jaccard import ResidueSpace
 
 
 @pytest.fixture
@@ -63,3 +69,63 @@ def test_union_4(f1):
 ])
 def test_overlap(rs, result):
     assert _merge_ranges(rs) == result
+
+
+def test_signature_cache_shared(f1):
+    clear_signature_cache()
+    sig = f1.signature(ResidueHashes(5, 10))
+    assert f1.signature(ResidueHashes(5, 10)) == sig
+    f1.signature(ResidueHashes(5, 20))
+    info = signature_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_signature_cache_bounded(f1, f2, f3):
+    clear_signature_cache()
+    set_signature_cache_size(2)
+    try:
+        for f in [f1, f2, f3]:
+            f.signature(ResidueHashes(5, 10))
+        assert signature_cache_info().currsize == 2
+        assert f3.signature(ResidueHashes(5, 10)) == ResidueHashes(5, 10).signature(f3)
+    finally:
+        set_signature_cache_size(4096)
+
+
+def test_signature_cache_does_not_keep_hashes(f1):
+    clear_signature_cache()
+    hashes = ResidueHashes(5, 10)
+    f1.signature(hashes)
+    f1.full_hash(hashes)
+    hashes_ref = weakref.ref(hashes)
+    del hashes
+    gc.collect()
+    assert hashes_ref() is None
+    # Regions can still be added, and the signatures are recomputed.
+    f1.add_region('a3', 1, 30)
+    hashes = ResidueHashes(5, 10)
+    assert f1.signature(hashes) == hashes.signature(f1)
+    assert f1.full_hash(hashes) == hashes.full_hash(f1)
+
+
+def test_run_length_set(f1, f2, f3):
+    space = ResidueSpace()
+    for a, b in [(f1, f2), (f1, f3), (f2, f3), (f3, f3)]:
+        s, t = space.encode(a), space.encode(b)
+        intersect = sum(len(r) for rs in a.overlap(b).values() for r in rs)
+        union = sum(len(r) for rs in a.union(b).values() for r in rs)
+        assert len(s) == a.residues_covered()
+        assert s.intersection_cardinality(t) == intersect
+        assert s.union_cardinality(t) == union
+        assert s.jaccard(t) == intersect / union
+
+
+@pytest.mark.parametrize("start, end", [(1, 16), (-1, 5)])
+def test_residue_space_out_of_range(start, end):
+    f = Family()
+    f.add_region('a1', start, end)
+    with pytest.raises(ValueError):
+        ResidueSpace(block_bits=4).encode(f)
+    f = Family()
+    f.add_region('a1', 1, 15)
+    assert len(ResidueSpace(block_bits=4).encode(f)) == 15
@@ -0,0 +1,357 @@
+import json
+import random
+from types import SimpleNamespace
+import pytest
+from searchsifter.Family import Family
+from searchsifter.relationships import pfam as pf
+from searchsifter.relationships import minhash as mh
+from searchsifter.relationships import jaccard as jc
+from searchsifter.relationships import codec, pfam_file, synthetic
+
+
+def _random_family(rng, proteins, size):
+    f = Family()
+    for acc in rng.sample(proteins, size):
+        start = rng.randint(1, 200)
+        f.add_region(acc, start, start + rng.randint(10, 100))
+    return f
+
+
+@pytest.fixture(scope="module")
+def families():
+    rng = random.Random(0)
+    proteins = ["P{:05}".format(i) for i in range(300)]
+    return {"PF{:05}".format(i): _random_family(rng, proteins,
+                                                 rng.randint(5, 80))
+            for i in range(40)}
+
+
+@pytest.fixture(scope="module")
+def hashes(families):
+    h = pf.ResidueHashes(25, 50)
+    h._hashes = {acc: h.signature(f) for acc, f in families.items()}
+    return h
+
+
+@pytest.mark.parametrize("threshold", [0, 0.05, 0.2, 0.5])
+def test_estimate_above_jaccard(families, hashes, threshold):
+    for family in families.values():
+        expected = {acc: s
+                    for acc, s in hashes.estimate_jaccard(family).items()
+                    if s >= threshold and s > 0}
+        scores, max_score = hashes.estimate_above(family, threshold)
+        assert scores == expected
+        assert max_score == 1
+
+
+@pytest.mark.parametrize("threshold", [0.05, 0.2, 0.5])
+def test_estimate_above_containment(families, hashes, threshold):
+    for family in families.values():
+        expected = {acc: s
+                    for acc, s in hashes.estimate_containment(family).items()
+                    if s >= threshold}
+        scores, max_score = hashes.estimate_above(family, threshold,
+                                                  pf.METRIC_CONTAINMENT)
+        assert scores == pytest.approx(expected)
+        assert max_score == 1
+
+
+@pytest.mark.parametrize("metric, estimate", [
+    (pf.METRIC_JACCARD, pf.Hashes.estimate_jaccard),
+    (pf.METRIC_CONTAINMENT, pf.Hashes.estimate_containment),
+])
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_top_k(families, hashes, metric, estimate, k):
+    for family in families.values():
+        all_scores = estimate(hashes, family)
+        expected = sorted((s for s in all_scores.values() if s > 0),
+                          reverse=True)[:k]
+        top = hashes.top_k(family, k, metric)
+        assert [s for _, s in top] == pytest.approx(expected)
+        for acc, s in top:
+            assert all_scores[acc] == pytest.approx(s)
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_top_k_empty(families, families_pfam, hashes, k):
+    family = families["PF00000"]
+    assert hashes.top_k(family, 1)
+    assert hashes.top_k(family, k) == []
+    for scorer in [pf.HashArrays(hashes),
+                   pf.OnePermutationHashes(64, pfam=families_pfam),
+                   pf.ContainmentIndex(pfam=families_pfam)]:
+        assert scorer.top_k(family, 1)
+        assert scorer.top_k(family, k) == []
+
+
+def test_estimates_compare_elements():
+    # Distinct elements sharing a hash are distinct in every scorer.
+    hashes = pf.Hashes(2, _hashes={"PF1": {(5, "x"), (7, "y")}})
+    signature = {(5, "a"), (7, "b")}
+    family = SimpleNamespace(signature=lambda h: signature,
+                             full_hash=lambda h: signature)
+    assert hashes.estimate_jaccard(family) == {"PF1": 0}
+    assert hashes.estimate_containment(family) == {"PF1": 0}
+    assert hashes.estimate_jaccard_many([family]) == [{"PF1": 0}]
+    assert hashes.estimate_above(family, 0).scores == {}
+    assert hashes.top_k(family, 1) == []
+
+
+@pytest.mark.parametrize("hashes", [pf.Hashes(20), pf.ResidueHashes(10, 20),
+                                    pf.Hashes(20, hash_bits=64),
+                                    pf.ResidueHashes(10, 20, hash_bits=64)])
+def test_incremental_signature(hashes):
+    rng = random.Random(1)
+    family = Family()
+    for _ in range(50):
+        acc = "P{:03}".format(rng.randint(0, 30))
+        start = rng.randint(1, 200)
+        family.add_region(acc, start, start + rng.randint(0, 60))
+        assert family.signature(hashes) == hashes.signature(family)
+        assert family.full_hash(hashes) == hashes.full_hash(family)
+
+
+def test_hashes_with_windows(families):
+    class FamiliesPfam(object):
+        @staticmethod
+        def FamiliesRegions():
+            return ((acc, set(f.regions())) for acc, f in families.items())
+
+    ws = [5, 10, 25, 100]
+    hashes = pf.ResidueHashes.hashes_with_windows(ws, 30, pfam=FamiliesPfam)
+    for w in ws:
+        for acc, family in families.items():
+            chunks = set(pf._chunk_iterator(family.regions(), w))
+            assert hashes[w].hashes[acc] == mh.signature(chunks, 30)
+
+
+@pytest.mark.parametrize("hash_bits", [32, 64])
+def test_residue_hashes(families, families_pfam, hash_bits):
+    hashes = pf.ResidueHashes(10, 30, pfam=families_pfam, hash_bits=hash_bits)
+    for acc, family in families.items():
+        chunks = set(pf._chunk_iterator(family.regions(), 10))
+        assert hashes.hashes[acc] == mh.signature(chunks, 30,
+                                                  hashes.hash_function)
+
+
+@pytest.mark.parametrize("w", [1, 7, 25])
+def test_chunk_array(families, w):
+    for family in families.values():
+        accs, protein_ids, starts, ends = pf.region_arrays(family.regions())
+        packed = pf.chunk_array(protein_ids, starts, ends, w)
+        expected = {(acc, c) for acc, s, e in family.regions()
+                    for c in pf.chunks_from_coordinates(s, e, w)}
+        assert pf._unpack_chunks(accs, packed) == sorted(expected)
+        assert (pf.ResidueHashes(w).full_hash(family) ==
+                mh.set_hashes(expected))
+
+
+@pytest.fixture(scope="module")
+def families_pfam(families):
+    return SimpleNamespace(
+        FamiliesRegions=lambda: ((acc, list(f.regions()))
+                                 for acc, f in families.items()))
+
+
+@pytest.mark.parametrize("b, w", [(None, None), (8, None), (16, 25)])
+def test_one_permutation_hashes(families, families_pfam, b, w, tmp_path):
+    hashes = pf.OnePermutationHashes(256, b, w, pfam=families_pfam)
+    exact = pf.ResidueHashes(w) if w else pf.Hashes()
+    for family in families.values():
+        query = family.full_hash(exact)
+        estimates = hashes.estimate_jaccard(family)
+        for acc, f in families.items():
+            expected = jc.jaccard({e for _, e in query},
+                                  {e for _, e in f.full_hash(exact)})
+            assert estimates[acc] == pytest.approx(expected, abs=0.15)
+        scores, _ = hashes.estimate_above(family, 0.2)
+        assert scores == {acc: s for acc, s in estimates.items() if s >= 0.2}
+        assert hashes._query_size(family) == len(query)
+
+    hashes.save_to_file(tmp_path / "hashes.npz")
+    with open(tmp_path / "hashes.npz", "rb") as f:
+        loaded = pf.OnePermutationHashes(from_file=f)
+    assert loaded.key == hashes.key
+    family = families["PF00000"]
+    assert loaded.estimate_containment(family) == \
+        hashes.estimate_containment(family)
+
+
+def test_incremental_one_permutation_signature():
+    hashes = pf.OnePermutationHashes(64, 8, 10)
+    rng = random.Random(1)
+    family = Family()
+    for _ in range(50):
+        acc = "P{:03}".format(rng.randint(0, 30))
+        start = rng.randint(1, 200)
+        family.add_region(acc, start, start + rng.randint(0, 60))
+        assert (family.signature(hashes) == hashes.signature(family)).all()
+
+
+def _weighted_jaccard(a, b):
+    a = dict(zip(*pf.protein_residues(a.regions())))
+    b = dict(zip(*pf.protein_residues(b.regions())))
+    proteins = set(a) | set(b)
+    return (sum(min(a.get(p, 0), b.get(p, 0)) for p in proteins) /
+            sum(max(a.get(p, 0), b.get(p, 0)) for p in proteins))
+
+
+def test_protein_residues(families):
+    for family in families.values():
+        accs, residues = pf.protein_residues(family.regions())
+        assert accs == sorted(family.proteins())
+        assert residues.sum() == family.residues_covered()
+
+
+def test_weighted_hashes(families, families_pfam):
+    hashes = pf.WeightedHashes(256, pfam=families_pfam)
+    for family in families.values():
+        estimates = hashes.estimate_jaccard(family)
+        for acc, f in families.items():
+            assert estimates[acc] == pytest.approx(
+                _weighted_jaccard(family, f), abs=0.15)
+
+
+def test_incremental_weighted_signature():
+    hashes = pf.WeightedHashes(64)
+    rng = random.Random(1)
+    family = Family()
+    for _ in range(50):
+        acc = "P{:03}".format(rng.randint(0, 30))
+        start = rng.randint(1, 200)
+        family.add_region(acc, start, start + rng.randint(0, 60))
+        assert (family.signature(hashes) == hashes.signature(family)).all()
+
+
+@pytest.mark.parametrize("w", [None, 25])
+def test_containment_index(families, families_pfam, w, tmp_path):
+    index = pf.ContainmentIndex(w, 0.001, pfam=families_pfam)
+    exact = pf.ResidueHashes(w) if w else pf.Hashes()
+    errors = []
+    lookups = 0
+    for family in families.values():
+        query = {e for _, e in family.full_hash(exact)}
+        accs, intersections, sizes, size = index.intersections(family)
+        assert size == len(query)
+        lookups += size * len(accs)
+        for acc, intersection in zip(accs, intersections):
+            elements = {e for _, e in families[acc].full_hash(exact)}
+            errors.append(abs(intersection - len(query & elements)))
+    # Each error is a false positive.
+    assert max(errors) < 2
+    assert sum(e > 0.5 for e in errors) < 2 * 0.001 * lookups
+
+    family = families["PF00000"]
+    estimates = index.estimate_jaccard(family)
+    scores, _ = index.estimate_above(family, 0.2)
+    assert scores == {acc: s for acc, s in estimates.items() if s >= 0.2}
+    best = max(estimates.items(), key=lambda item: item[1])
+    assert index.top_k(family, 1) == [best]
+
+    index.save_to_file(tmp_path / "index.npz")
+    with open(tmp_path / "index.npz", "rb") as f:
+        loaded = pf.ContainmentIndex(from_file=f)
+    assert loaded.estimate_containment(family) == \
+        index.estimate_containment(family)
+
+
+def test_hash_arrays(families, hashes, tmp_path):
+    arrays = pf.HashArrays(hashes)
+    for family in list(families.values())[:10]:
+        assert arrays.estimate_jaccard(family) == hashes.estimate_jaccard(family)
+        assert (arrays.estimate_containment(family) ==
+                hashes.estimate_containment(family))
+
+    filename = str(tmp_path / "hashes.npz")
+    arrays.save_to_file(filename, provenance=True)
+    with open(filename, "rb") as f:
+        loaded = pf.HashArrays(pf.ResidueHashes(25, 50), from_file=f)
+    family = families["PF00000"]
+    assert loaded.estimate_jaccard(family) == hashes.estimate_jaccard(family)
+    assert (pf.HashArrays.provenance(filename, "PF00003") ==
+            dict(hashes.hashes["PF00003"]))
+    with open(filename, "rb") as f, pytest.raises(ValueError):
+        pf.HashArrays(pf.ResidueHashes(10, 50), from_file=f)
+
+
+@pytest.mark.parametrize("hash_bits", [32, 64])
+def test_hash_arrays_provenance_hash_bits(families_pfam, hash_bits, tmp_path):
+    hashes = pf.ResidueHashes(25, 50, pfam=families_pfam, hash_bits=hash_bits)
+    filename = str(tmp_path / "hashes.npz")
+    pf.HashArrays(hashes).save_to_file(filename, provenance=True)
+    with open(pf.HashArrays.provenance_location(filename), "rb") as f:
+        assert codec.SignatureReader(f).hash_bits == hash_bits
+    assert (pf.HashArrays.provenance(filename, "PF00003") ==
+            dict(hashes.hashes["PF00003"]))
+
+
+def test_hash_bits(families, families_pfam, tmp_path):
+    hashes = pf.ResidueHashes.hashes_with_windows([25], 30, pfam=families_pfam,
+                                                  hash_bits=64)[25]
+    for acc, family in families.items():
+        chunks = set(pf._chunk_iterator(family.regions(), 25))
+        assert hashes.hashes[acc] == mh.signature(chunks, 30, mh.hash64)
+        assert hashes.signature(family) == hashes.hashes[acc]
+    for family in list(families.values())[:5]:
+        assert hashes.estimate_jaccard(family) == pytest.approx(
+            {a: mh.minhash(hashes.signature(family), s, 30)
+             for a, s in hashes})
+    assert hashes.key != pf.ResidueHashes(25, 30).key
+
+    for compress, mode in [(False, "r"), (True, "rb")]:
+        filename = str(tmp_path / "hashes_{}".format(compress))
+        hashes.save_to_file(filename, compress=compress)
+        with open(filename, mode) as f:
+            assert pf.ResidueHashes(25, 30, from_file=f,
+                                    hash_bits=64).hashes == hashes.hashes
+        with open(filename, mode) as f, pytest.raises(ValueError):
+            pf.ResidueHashes(25, 30, from_file=f)
+
+
+def test_unversioned_hash_file(tmp_path):
+    hashes = pf.Hashes(10, _hashes={"PF1": mh.signature(["a", "b"], 10)})
+    filename = tmp_path / "hashes.json"
+    filename.write_text(json.dumps({k: list(v)
+                                    for k, v in hashes.hashes.items()}))
+    with open(filename) as f:
+        assert pf.Hashes(10, from_file=f).hashes == hashes.hashes
+    with open(filename) as f, pytest.raises(ValueError):
+        pf.Hashes(10, from_file=f, hash_bits=64)
+
+
+@pytest.mark.parametrize("filetype, clans_filetype", [
+    (pfam_file.PFAM_FILETYPE_REGIONS, pfam_file.PFAM_CLANS_FILETYPE_TSV),
+    (pfam_file.PFAM_FILETYPE_STOCKHOLM,
+     pfam_file.PFAM_CLANS_FILETYPE_STOCKHOLM),
+])
+def test_clans_from_files(tmp_path, filetype, clans_filetype):
+    pfam = synthetic.SyntheticPfam(families=20, proteins=300, members=10,
+                                   clan_fraction=0.5, clan_size=3, seed=2)
+    filename = str(tmp_path / "pfam.gz")
+    clans_filename = str(tmp_path / "clans.gz")
+    if filetype == pfam_file.PFAM_FILETYPE_REGIONS:
+        synthetic.write_regions(pfam, filename)
+    else:
+        synthetic.write_stockholm(pfam, filename)
+    synthetic.write_clans(pfam, clans_filename, clans_filetype)
+    pfam_args = [filename, filetype]
+    clans_args = [clans_filename, clans_filetype]
+
+    membership = pf.ClanMembership(pfam=pfam_file, clans_args=clans_args)
+    assert dict(membership.clans) == pfam.clans
+    hashes = pf.Hashes(10, pfam=pfam_file, pfam_args=pfam_args,
+                       clans_args=clans_args)
+    assert (hashes.clan_hashes().hashes ==
+            hashes.clan_hashes(pfam.clans.items()).hashes)
+    assert set(hashes.clan_hashes().hashes) == set(pfam.clans)
+    oph = pf.OnePermutationHashes(16, pfam=pfam_file, pfam_args=pfam_args,
+                                  clans_args=clans_args)
+    assert set(oph.clan_hashes().hashes) == set(pfam.clans)
+    sizes = pf.Sizes(pfam=pfam_file, pfam_args=pfam_args,
+                     clans_args=clans_args)
+    assert sizes.clan_sizes().sizes == {
+        c: len(set().union(*(pfam.family(f).proteins() for f in fs)))
+        for c, fs in pfam.clans.items()}
+    sketch_sizes = pf.SketchSizes(pfam=pfam_file, pfam_args=pfam_args,
+                                  clans_args=clans_args)
+    assert set(sketch_sizes.clan_sizes().sizes) == set(pfam.clans)
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+import pytest
+from searchsifter.relationships.hyperloglog import HyperLogLog
+from searchsifter.relationships import pfam as pf
+
+
+@pytest.mark.parametrize("n", [0, 10, 1000, 50000])
+def test_cardinality(n):
+    sketch = HyperLogLog.from_elements(range(n))
+    assert sketch.cardinality() == pytest.approx(n, rel=0.05)
+
+
+def test_union_and_intersection():
+    a = HyperLogLog.from_elements(range(0, 6000))
+    b = HyperLogLog.from_elements(range(4000, 10000))
+    assert (a | b).cardinality() == pytest.approx(10000, rel=0.05)
+    assert a.intersection_cardinality(b) == pytest.approx(2000, abs=600)
+
+
+def test_string_round_trip():
+    a = HyperLogLog.from_elements("abcdef", p=6)
+    b = HyperLogLog.from_string(a.to_string(), 6)
+    assert (a.registers == b.registers).all()
+
+
+@pytest.fixture
+def families_pfam():
+    families = {"PF1": [("P1", 1, 100), ("P2", 1, 50)],
+                "PF2": [("P2", 1, 50), ("P3", 10, 60)],
+                "PF3": [("P4", 1, 10)]}
+    return SimpleNamespace(
+        FamiliesRegions=lambda: iter(families.items()),
+        Clans=lambda: iter([("CL1", {"PF1", "PF2"})]))
+
+
+@pytest.mark.parametrize("w, expected", [(None, {"PF1": 2, "PF2": 2, "PF3": 1}),
+                                         (10, {"PF1": 17, "PF2": 12, "PF3": 2})])
+def test_sketch_sizes(families_pfam, w, expected):
+    sizes = pf.SketchSizes(w, pfam=families_pfam)
+    assert sizes.sizes == expected
+    clan_sizes = sizes.clan_sizes()
+    assert clan_sizes.sizes == {"CL1": expected["PF1"] + expected["PF2"] -
+                                sizes.intersection_size("PF1", "PF2")}
+    f = pf.Family()
+    for region in next(families_pfam.FamiliesRegions())[1]:
+        f.add_region(*region)
+    assert sizes.size_method(f) == expected["PF1"]
+
+
+def test_sketch_sizes_round_trip(families_pfam, tmp_path):
+    sizes = pf.SketchSizes(10, p=8, pfam=families_pfam)
+    sizes.save_to_file(tmp_path / "sizes.json")
+    with open(tmp_path / "sizes.json") as f:
+        loaded = pf.SketchSizes(from_file=f)
+    assert (loaded.w, loaded.p) == (10, 8)
+    assert loaded.sizes == sizes.sizes
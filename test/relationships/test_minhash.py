@@ -1,3 +1,5 @@
+import random
+import numpy as np
 import pytest
 import searchsifter.relationships.minhash as mh
 import searchsifter.relationships.jaccard as jc
@@ -72,3 +74,74 @@ def test_intersection(a, b, c):
 def test_union(a, b):
     assert mh.union_signature(a, b, 100) == a
     assert len(mh.union_signature(a, b, 20)) == 20
+
+
+def test_merge_signatures(a, b, c):
+    assert mh.merge_signatures([sorted(a), sorted(b)], 100) == a
+    assert mh.merge_signatures([sorted(b), sorted(c)], 10) == set(range(50, 60))
+    assert (mh.merge_signatures([sorted(a), sorted(b), sorted(c)], 20) ==
+            mh.union_signature(a, b, c, 20))
+
+
+def test_crc32_pair_hashes():
+    chunks = [0, 7, 12, 12345]
+    assert (mh.crc32_pair_hashes("P12345", chunks) ==
+            [mh._crc32_hash(("P12345", c)) for c in chunks])
+
+
+def test_hash64_pairs():
+    chunks = [0, 7, 12, 12345]
+    assert (mh.hash64_pairs("P12345", chunks).tolist() ==
+            [mh.hash64(("P12345", c)) for c in chunks])
+
+
+@pytest.mark.parametrize("value", [np.int64(12), np.uint64(12),
+                                   np.int32(12)])
+def test_hash64_numpy_integers(value):
+    assert mh.hash64(("P12345", value)) == mh.hash64(("P12345", 12))
+    assert mh.hash64(value) == mh.hash64(12)
+
+
+@pytest.mark.parametrize("b", [None, 1, 8])
+def test_one_permutation_signature(b):
+    hashes = mh._mix64(np.arange(20, dtype=np.uint64))
+    signature = mh.one_permutation_signature(hashes, 64, b)
+    assert len(signature) == 64
+    assert mh.one_permutation_jaccard(signature, signature, b) == 1
+    other = mh.one_permutation_signature(hashes[:10], 64, b)
+    assert 0 < mh.one_permutation_jaccard(signature, other, b) < 1
+
+
+def test_sorted_kernels():
+    rng = random.Random(0)
+    sigs = [mh.signature(rng.sample(range(300), rng.randint(0, 150)), 50)
+            for _ in range(30)]
+    matrix = mh.signature_matrix(sigs, 50)
+    for t in sigs[:5]:
+        full_hash = mh.set_hashes({e for _, e in t})
+        assert (mh.sorted_minhash(matrix, mh.signature_array(t), 50).tolist()
+                == pytest.approx([mh.minhash(s, t, 50) for s in sigs]))
+        assert (mh.sorted_containment(matrix, mh.signature_array(full_hash))
+                .tolist() == pytest.approx(
+                    [mh.minhash_containment(s, full_hash) for s in sigs]))
+
+
+@pytest.mark.parametrize("compiled", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        not mh.COMPILED_KERNELS, reason="compiled kernels not built")),
+])
+def test_row_kernels(compiled, monkeypatch):
+    if not compiled:
+        monkeypatch.setattr(mh, "_minhash_kernels", None)
+    rng = random.Random(1)
+    sigs = [mh.signature(rng.sample(range(300), rng.randint(0, 150)), 50)
+            for _ in range(30)]
+    matrix = mh.signature_matrix(sigs, 50)
+    for t in sigs[:5] + [set()]:
+        full_hash = mh.set_hashes({e for _, e in t})
+        assert (mh.jaccard_rows(matrix, mh.signature_array(t), 50).tolist()
+                == pytest.approx([mh.minhash(s, t, 50) for s in sigs]))
+        assert (mh.containment_rows(matrix, mh.signature_array(full_hash))
+                .tolist() == pytest.approx(
+                    [mh.minhash_containment(s, full_hash) for s in sigs]))
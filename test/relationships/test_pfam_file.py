@@ -0,0 +1,45 @@
+import gzip
+import pytest
+import searchsifter.relationships.pfam_file as pf
+
+
+CLANS_TSV = ("PF00001\tCL0192\tGPCR_A\t7tm_1\t7 transmembrane receptor\n"
+             "PF00002\tCL0192\tGPCR_A\t7tm_2\t7 transmembrane receptor\n"
+             "PF00004\tCL0023\tP-loop_NTPase\tAAA\tATPase family\n"
+             "PF00005\t\t\tABC_tran\tABC transporter\n")
+
+CLANS_STOCKHOLM = ("# STOCKHOLM 1.0\n"
+                   "#=GF ID   GPCR_A\n"
+                   "#=GF AC   CL0192.14\n"
+                   "#=GF MB   PF00001;\n"
+                   "#=GF MB   PF00002;\n"
+                   "//\n"
+                   "# STOCKHOLM 1.0\n"
+                   "#=GF ID   P-loop_NTPase\n"
+                   "#=GF AC   CL0023.38\n"
+                   "#=GF MB   PF00004;\n"
+                   "//\n")
+
+
+@pytest.fixture(params=[(CLANS_TSV, pf.PFAM_CLANS_FILETYPE_TSV),
+                        (CLANS_STOCKHOLM, pf.PFAM_CLANS_FILETYPE_STOCKHOLM)])
+def clans(request, tmp_path):
+    contents, filetype = request.param
+    filename = str(tmp_path / "clans.gz")
+    with gzip.open(filename, 'wt') as clans_file:
+        clans_file.write(contents)
+    return pf.Clans(filename, filetype)
+
+
+def test_clans_iter(clans):
+    assert dict(clans) == {"CL0192": {"PF00001", "PF00002"},
+                           "CL0023": {"PF00004"}}
+
+
+def test_families_in_clan(clans):
+    assert clans.families_in_clan("CL0192") == {"PF00001", "PF00002"}
+
+
+def test_clan_for_family(clans):
+    assert clans.clan_for_family("PF00002") == "CL0192"
+    assert clans.clan_for_family("PF00005") is None
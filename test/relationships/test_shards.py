@@ -0,0 +1,97 @@
+import multiprocessing
+import shutil
+import pytest
+from searchsifter.Family import Family
+from searchsifter.relationships import pfam as pf
+from searchsifter.relationships import minhash as mh
+from searchsifter.relationships import shards
+from searchsifter.relationships.shards import save_shards, ShardedHashes
+
+
+def _family(*accs):
+    f = Family()
+    for acc in accs:
+        f.add_region(acc, 1, 10)
+    return f
+
+
+@pytest.fixture(scope="module")
+def hashes():
+    proteins = [chr(c) for c in range(ord("a"), ord("z") + 1)]
+    return pf.Hashes(n=8, hash_bits=64, _hashes={
+        "PF{}".format(i): mh.signature(proteins[i:i + 3 * (i % 4 + 1)], 8,
+                                       mh.hash64)
+        for i in range(20)})
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_sharded_hashes(hashes, tmp_path, processes):
+    save_shards(hashes, str(tmp_path), 3)
+    searches = [_family("a", "b", "c", "d"), _family("k", "x", "y"),
+                _family("q")]
+    with ShardedHashes(str(tmp_path), pf.Hashes(n=8, hash_bits=64),
+                       processes=processes) as sharded:
+        assert (sharded.estimate_jaccard_many(searches) ==
+                hashes.estimate_jaccard_many(searches))
+        for search in searches:
+            assert (sharded.estimate_containment(search) ==
+                    hashes.estimate_containment(search))
+            assert ([s for _, s in sharded.top_k(search, 3)] ==
+                    [s for _, s in hashes.top_k(search, 3)])
+
+
+def _top_k_in_worker(args):
+    directory, search = args
+    with ShardedHashes(directory, pf.Hashes(n=8, hash_bits=64)) as sharded:
+        return sharded.top_k(search, 3)
+
+
+def test_sharded_hashes_pool(hashes, tmp_path):
+    save_shards(hashes, str(tmp_path), 3)
+    search = _family("a", "b", "c", "d")
+    sharded = ShardedHashes(str(tmp_path), pf.Hashes(n=8, hash_bits=64),
+                            processes=2)
+    assert sharded._pool is None
+    expected = sharded.top_k(search, 3)
+    assert sharded._pool is not None
+    sharded.close()
+    assert sharded._pool is None
+
+    # Workers are daemonic, so can't start a pool of their own.
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        assert pool.map(_top_k_in_worker,
+                        [(str(tmp_path), search)]) == [expected]
+
+
+def test_sharded_hashes_key(hashes, tmp_path):
+    save_shards(hashes, str(tmp_path), 2)
+    with pytest.raises(ValueError):
+        ShardedHashes(str(tmp_path), pf.Hashes(n=10, hash_bits=64),
+                      processes=0)
+
+
+def test_sharded_hashes_hash_bits(hashes, tmp_path):
+    with pytest.raises(ValueError):
+        save_shards(pf.Hashes(n=8, _hashes={"PF1": {(5, "x"), (7, "y")}}),
+                    str(tmp_path / "crc"), 1)
+    save_shards(hashes, str(tmp_path), 2)
+    with pytest.raises(ValueError):
+        ShardedHashes(str(tmp_path), pf.Hashes(n=8), processes=0)
+
+
+def test_sharded_hashes_rewritten(tmp_path):
+    directory = str(tmp_path / "shards")
+    search = _family("a", "b")
+    for pfam in [{"PF1": ["a", "b"], "PF2": ["c"]},
+                 {"PF1": ["c"], "PF2": ["a", "b"]}]:
+        hashes = pf.Hashes(n=8, hash_bits=64, _hashes={
+            acc: mh.signature(proteins, 8, mh.hash64)
+            for acc, proteins in pfam.items()})
+        shutil.rmtree(directory, ignore_errors=True)
+        save_shards(hashes, directory, 1)
+        sharded = ShardedHashes(directory, pf.Hashes(n=8, hash_bits=64),
+                                processes=0)
+        assert (sharded.estimate_jaccard(search) ==
+                hashes.estimate_jaccard(search))
+    sharded.close()
+    assert all(token != sharded._token for token, _ in shards._open_shards)
@@ -0,0 +1,65 @@
+import json
+import pytest
+import searchsifter.relationships.pfam_file as pf
+import searchsifter.relationships.pfam_db as pdb
+from searchsifter.relationships import synthetic
+from searchsifter.relationships.pfam import Hashes
+
+
+@pytest.fixture
+def pfam():
+    return synthetic.SyntheticPfam(families=30, proteins=500, members=15,
+                                   clan_fraction=0.5, clan_size=3, seed=1)
+
+
+def test_synthetic_pfam(pfam):
+    again = synthetic.SyntheticPfam(families=30, proteins=500, members=15,
+                                    clan_fraction=0.5, clan_size=3, seed=1)
+    assert again.regions == pfam.regions
+    assert again.clans == pfam.clans
+    assert len(pfam.regions) == 30
+    assert sum(map(len, pfam.clans.values())) == 15
+    for regions in pfam.regions.values():
+        assert regions
+        for acc, start, end in regions:
+            assert 1 <= start <= end <= pfam.lengths[acc]
+    # Families in a clan share members.
+    assert any(pfam.family(a).jaccard_index(pfam.family(b)) > 0
+               for families in pfam.clans.values()
+               for a in families for b in families if a < b)
+
+
+@pytest.mark.parametrize("write, filetype", [
+    (synthetic.write_regions, pf.PFAM_FILETYPE_REGIONS),
+    (synthetic.write_stockholm, pf.PFAM_FILETYPE_STOCKHOLM),
+])
+def test_write_pfam_file(pfam, tmp_path, write, filetype):
+    filename = str(tmp_path / "pfam.gz")
+    write(pfam, filename)
+    assert dict(pf.pfam_file_iter(filename, filetype)) == dict(pfam)
+    hashes = Hashes(n=10, pfam=pf, pfam_args=[filename, filetype])
+    assert set(hashes.hashes) == set(pfam.regions)
+
+
+@pytest.mark.parametrize("filetype", [pf.PFAM_CLANS_FILETYPE_TSV,
+                                      pf.PFAM_CLANS_FILETYPE_STOCKHOLM])
+def test_write_clans(pfam, tmp_path, filetype):
+    filename = str(tmp_path / "clans.gz")
+    synthetic.write_clans(pfam, filename, filetype)
+    assert dict(pf.Clans(filename, filetype)) == dict(pfam.clans)
+
+
+def test_write_sqlite(pfam, tmp_path, monkeypatch):
+    db_filename = str(tmp_path / "pfam.sqlite")
+    config_filename = str(tmp_path / "db.json")
+    synthetic.write_sqlite(pfam, db_filename)
+    with open(config_filename, 'w') as config_file:
+        json.dump({pdb.SQLITE_CONFIG_KEY: db_filename}, config_file)
+    monkeypatch.setenv("SEARCH_SIFTER_DB_CONFIG", config_filename)
+    monkeypatch.setattr(pdb.PfamFamily, "_instances", {})
+
+    assert dict(pdb.FamiliesRegions()) == dict(pfam)
+    assert dict(pdb.Clans()) == dict(pfam.clans)
+    acc = next(iter(pfam.regions))
+    family = pdb.PfamFamily.from_accession(acc)
+    assert family.jaccard_index(pfam.family(acc)) == 1
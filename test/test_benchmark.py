@@ -0,0 +1,17 @@
+from searchsifter.scripts import benchmark as bm
+
+
+def test_benchmarks(tmp_path):
+    data = bm.SyntheticData(str(tmp_path), families=20, proteins=200,
+                            members=10, searches=3, n=16, w=20)
+    assert len(data.hashes.hashes) == 20
+    results = bm.run_benchmarks(data, repeat=1)
+    assert list(results) == list(bm.BENCHMARKS)
+    assert all(t >= 0 for t in results.values())
+
+
+def test_compare():
+    comparisons, regressions = bm.compare(
+        {"a": 1.0, "b": 2.0, "c": 1.0}, {"a": 1.0, "b": 1.0}, tolerance=0.2)
+    assert comparisons == [("a", 1.0, 1.0, 1.0), ("b", 1.0, 2.0, 2.0)]
+    assert regressions == ["b"]
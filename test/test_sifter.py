@@ -0,0 +1,160 @@
+import gc
+from types import SimpleNamespace
+import pytest
+from searchsifter import Family
+from searchsifter import sifter as sf
+from searchsifter.relationships import minhash as mh
+from searchsifter.relationships.pfam import (Hashes, ClanMembership,
+                                             ContainmentIndex)
+
+
+def _family(*accs):
+    f = Family()
+    for acc in accs:
+        f.add_region(acc, 1, 10)
+    return f
+
+
+@pytest.fixture
+def hashes():
+    return Hashes(n=10, _hashes={
+        "PF1": mh.signature(["a", "b", "c", "d"], 10),
+        "PF2": mh.signature(["e", "f", "g", "h"], 10),
+        "PF3": mh.signature(["i", "j"], 10),
+    })
+
+
+@pytest.fixture
+def searches():
+    return [_family("a", "b", "c", "d"),
+            _family("a", "b", "e", "f"),
+            _family("x", "y"),
+            _family("i", "j", "e", "f")]
+
+
+def _graph(hashes, low_threshold=0.2, clan_threshold=0.2):
+    terminators = {name: sf.Terminator()
+                   for name in ["low", "high", "same", "different"]}
+    clans = ClanMembership(_clans=[("CL1", {"PF1", "PF2"})])
+    clan_sifter = sf.ClanSifter(clan_threshold, terminators["same"],
+                                terminators["different"], clans=clans)
+    root = sf.EstimateJaccardSifter(hashes, low_threshold, 0.9,
+                                    terminators["low"], terminators["high"],
+                                    clan_sifter)
+    return root, terminators
+
+
+def _routes(terminators):
+    return {name: sorted(t.results) for name, t in terminators.items()}
+
+
+def test_sift(hashes, searches):
+    root, terminators = _graph(hashes)
+    for i, search in enumerate(searches):
+        root.sift(sf.package(search, i))
+    assert _routes(terminators) == {"low": [2], "high": [0],
+                                    "same": [1], "different": [3]}
+
+
+def test_sift_batch(hashes, searches):
+    root, terminators = _graph(hashes)
+    for i, search in enumerate(searches):
+        root.sift(sf.package(search, i))
+    batch_root, batch_terminators = _graph(hashes)
+    batch_root.sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    assert _routes(batch_terminators) == _routes(terminators)
+    for name, t in terminators.items():
+        for id_, result in t.results.items():
+            batch_result = batch_terminators[name].results[id_]
+            assert (batch_result[sf.FAMILY_HASH_SCORES] ==
+                    result[sf.FAMILY_HASH_SCORES])
+
+
+def test_sift_parallel(hashes, searches):
+    root, terminators = _graph(hashes)
+    for i, search in enumerate(searches):
+        root.sift(sf.package(search, i))
+    parallel_root, parallel_terminators = _graph(hashes)
+    sf.sift_parallel(parallel_root,
+                     (sf.package(s, i) for i, s in enumerate(searches)),
+                     processes=2, batch_size=1)
+    assert _routes(parallel_terminators) == _routes(terminators)
+    for t in parallel_terminators.values():
+        for id_, result in t.results.items():
+            assert result[sf.SEARCH] is searches[id_]
+            assert result[sf.SIFTS][0] is parallel_root
+    assert gc.get_freeze_count() == 0
+
+
+@pytest.mark.parametrize("terminator", [sf.JSONLinesTerminator,
+                                        sf.TSVTerminator])
+@pytest.mark.parametrize("compress", [False, True])
+def test_streaming_terminator(hashes, searches, tmp_path, terminator,
+                              compress):
+    filename = str(tmp_path / "results")
+    with terminator(filename, compress=compress) as stream:
+        root = sf.EstimateJaccardSifter(hashes, 0.2, 0.9,
+                                        stream, stream, stream)
+        root.sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    assert not hasattr(stream, "results")
+    results = sorted(terminator.read(filename), key=lambda r: str(r[sf.ID]))
+    assert [str(r[sf.ID]) for r in results] == ["0", "1", "2", "3"]
+    assert all(r[sf.SIFTS] == ["S", terminator.__name__] for r in results)
+    assert set(results[1][sf.FAMILY_HASH_SCORES]) == {"PF1", "PF2"}
+    assert results[2][sf.FAMILY_HASH_SCORES] == {}
+
+
+def test_size_sifter_record(hashes, searches):
+    class FixedSizes(object):
+        sizes = {"PF1": 4, "PF2": 4, "PF3": 2}
+        size_method = staticmethod(Family.proteins_covered)
+
+    bigger, smaller = sf.Terminator(), sf.Terminator()
+    size_sifter = sf.SizeSifter(FixedSizes(), bigger, smaller,
+                                abs_threshold=3)
+    root = sf.EstimateJaccardSifter(hashes, 0.2, 0.9,
+                                    size_sifter, size_sifter, size_sifter)
+    root.sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    assert sorted(bigger.results) == [0, 1, 2]
+    assert sorted(smaller.results) == [3]
+    record = bigger.results[1]
+    assert record[sf.SEARCH_SIZE] == 4
+    assert record[sf.ABSOLUTE_SIZES] == {"PF1": 4, "PF2": 4}
+    assert record[sf.RELATIVE_SIZES] == {"PF1": 1, "PF2": 1}
+    assert (record[sf.NORMALISED_FAMILY_HASH_SCORES] ==
+            record[sf.FAMILY_HASH_SCORES])
+    assert record[sf.SIFTS] == [root, size_sifter, bigger]
+
+
+@pytest.mark.parametrize("low_threshold", [0, 0.2, 0.4])
+def test_sift_prune(hashes, searches, low_threshold):
+    root, terminators = _graph(hashes, low_threshold, low_threshold)
+    root.sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    pruned_root, pruned_terminators = _graph(hashes, low_threshold,
+                                             low_threshold)
+    pruned_root.prune = True
+    pruned_root.sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    assert _routes(pruned_terminators) == _routes(terminators)
+    # Only the families reaching the low threshold are recorded.
+    for name, t in terminators.items():
+        for id_, result in t.results.items():
+            pruned = pruned_terminators[name].results[id_]
+            assert pruned[sf.FAMILY_HASH_SCORES] == {
+                f: s for f, s in result[sf.FAMILY_HASH_SCORES].items()
+                if s >= low_threshold}
+
+
+def test_sift_batch_dispatches_to_hashes(searches):
+    families = {"PF1": [("a", 1, 10), ("b", 1, 10), ("c", 1, 10)],
+                "PF2": [("e", 1, 10), ("f", 1, 10)]}
+    index = ContainmentIndex(pfam=SimpleNamespace(
+        FamiliesRegions=lambda: iter(families.items())))
+    sifters = [sf.EstimateContainmentSifter(index, 0.1, 0.9, *[sf.Terminator()
+                                                                for _ in range(3)])
+               for _ in range(2)]
+    sifters[0].sift_batch([sf.package(s, i) for i, s in enumerate(searches)])
+    for i, s in enumerate(searches):
+        sifters[1].sift(sf.package(s, i))
+    for a, b in zip(sifters[0].sinks.values(), sifters[1].sinks.values()):
+        assert ({i: r.scores for i, r in a.results.items()} ==
+                {i: r.scores for i, r in b.results.items()})